@@ -1,23 +1,22 @@
 import streamlit as st
 import json
+import os
+import pandas as pd
 import plotly.express as px
 from src.analysis import (
     analyze_growth,
-    calculate_orders_by_event,
-    calculate_top_heavy_users,
-    calculate_top_users_event_summary,
-    calculate_unique_order_values_by_event,
-    project_client_metrics,
-    process_json_data,
-    calculate_game_distribution,
     calculate_tickets_by_game_and_month,
-    calculate_event_summary_with_outside_events,
-    process_competition_data,
-    create_engagement_graph,
+    project_client_metrics,
     process_age_distribution,
     process_gender_distribution,
 )
-from src.data_loader import load_json_data
+from src.competitions import CompetitionPanel
+from src.player_index import HISTORY_TABLES
+from src.projection import evaluate_projection_grid
+from src.refresh import RefreshEngine
+from src.sessions import daily_session_metrics, format_duration, window_session_metrics
+from src.sketches import summarize_sketches
+from src.timebuckets import DRILL_DOWN, within_bucket
 
 # Personalização do layout
 st.set_page_config(
@@ -65,36 +64,80 @@ st.markdown(
 st.markdown('<h1 class="center-text">Análise e Projeções do GameRoom da Monaco</h1>', unsafe_allow_html=True)
 st.markdown('<p class="center-text">Explore os dados de partidas, tickets, usuários e resultados de gamificação.</p>', unsafe_allow_html=True)
 
-# Caminho dos dados
-DATA_DIR = "data/"
-
-# Carregando os dados
-data = load_json_data(DATA_DIR)
-
-if not data:
+# Caminho dos dados (MONACO_DATA_DIR permite apontar para outro conjunto, ex.: no teste de carga)
+DATA_DIR = os.environ.get("MONACO_DATA_DIR", "data/")
+# Armazenamento local particionado por mês (gerado a partir de data/)
+STORE_DIR = os.environ.get("MONACO_STORE_DIR", "store/")
+# Tabelas em Arrow mapeadas em memória, compartilhadas entre sessões e processos
+SHARED_DIR = os.path.join(STORE_DIR, "shared/")
+# Processos para decodificar as tabelas e calcular as seções pesadas (0 = apenas threads)
+PROCESSES = int(os.environ.get("MONACO_PROCESSES", "0"))
+
+# Motor de atualização incremental compartilhado entre as sessões
+@st.cache_resource
+def get_refresh_engine(data_dir, store_dir, shared_dir, processes):
+    return RefreshEngine(data_dir, store_dir=store_dir, shared_dir=shared_dir, processes=processes)
+
+engine = get_refresh_engine(DATA_DIR, STORE_DIR, SHARED_DIR, PROCESSES)
+engine.refresh()
+
+GRANULARITY_LABELS = {"month": "Mês", "day": "Dia", "hour": "Hora"}
+
+# Séries de crescimento detalhadas (dias de um mês ou horas de um dia, no horário de
+# Brasília), calculadas sob demanda e guardadas por versão dos dados
+@st.cache_data(show_spinner=False)
+def get_growth_drilldown(_engine, data_version, granularity, period):
+    parent = {child: parent for parent, child in DRILL_DOWN.items()}[granularity]
+    game_histories, tickets, users = (
+        frame[within_bucket(frame["createdAt"], period, parent)]
+        for frame in (_engine.tables["game_histories"], _engine.tables["tickets"], _engine.tables["users"])
+    )
+    return (
+        analyze_growth(game_histories, tickets, users, granularity),
+        calculate_tickets_by_game_and_month(tickets, granularity),
+    )
+
+if not engine.tables:
     st.error("Erro ao carregar os dados. Verifique os arquivos JSON.")
 else:
-    # Processar dados
-    game_histories = process_json_data(data.get("gamehistories", []), "game_histories")
-    tickets = process_json_data(data.get("tickets", []), "tickets")
-    users = process_json_data(data.get("users", []), "users")
-    game_events = process_json_data(data.get("gameevents", []), "game_events")
+    game_histories = engine.tables["game_histories"]
+    tickets = engine.tables["tickets"]
+    users = engine.tables["users"]
 
     # Crescimento em 2024
     st.header("Crescimento em 2024")
+    granularity, period = "month", None
     try:
-        games_per_month, total_tickets_amount, users_per_month = analyze_growth(
-            game_histories, tickets, users
-        )
+        games_per_month, total_tickets_amount, users_per_month = engine.get("growth")
+
+        # Detalhamento: mês -> dias do mês -> horas do dia
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.subheader("Partidas por Mês (Total - 7684)")
+            granularity = st.radio(
+                "Granularidade", list(GRANULARITY_LABELS), format_func=GRANULARITY_LABELS.get,
+                horizontal=True, key="growth_granularity",
+            )
+        if granularity != "month":
+            with col2:
+                period = st.selectbox("Mês", list(games_per_month.index), key="growth_month")
+            if granularity == "hour":
+                (games_per_day, _, _), _ = get_growth_drilldown(engine, engine.data_version, "day", period)
+                with col3:
+                    period = st.selectbox("Dia", list(games_per_day.index), key="growth_day")
+            (games_per_month, total_tickets_amount, users_per_month), _ = get_growth_drilldown(
+                engine, engine.data_version, granularity, period
+            )
+
+        label = GRANULARITY_LABELS[granularity]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.subheader(f"Partidas por {label} (Total - {games_per_month.sum():,.0f})".replace(",", "."))
             st.line_chart(games_per_month)
         with col2:
-            st.subheader("Tickets por Mês (Total - 567.593)")
+            st.subheader(f"Tickets por {label} (Total - {total_tickets_amount.sum():,.0f})".replace(",", "."))
             st.line_chart(total_tickets_amount)
         with col3:
-            st.subheader("Usuários por Mês (Total - 1314)")
+            st.subheader(f"Usuários por {label} (Total - {users_per_month.sum():,.0f})".replace(",", "."))
             st.line_chart(users_per_month)
     except Exception as e:
         st.error(f"Erro ao analisar crescimento: {e}")
@@ -139,12 +182,16 @@ else:
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Por Jogos")
-            game_ticket_distribution = calculate_game_distribution(tickets)
+            game_ticket_distribution = engine.get("game_distribution")
             st.bar_chart(game_ticket_distribution)
 
         with col2:
-            st.subheader("Por Meses")
-            tickets_by_game_and_month = calculate_tickets_by_game_and_month(tickets)
+            # Segue o detalhamento escolhido em "Crescimento em 2024"
+            st.subheader(f"Por {GRANULARITY_LABELS[granularity]}")
+            if granularity == "month":
+                tickets_by_game_and_month = engine.get("tickets_by_game_and_month")
+            else:
+                _, tickets_by_game_and_month = get_growth_drilldown(engine, engine.data_version, granularity, period)
             st.line_chart(tickets_by_game_and_month)
     except Exception as e:
         st.error(f"Erro ao calcular distribuição de tickets: {e}")
@@ -154,28 +201,38 @@ else:
     try:
         col1, col2, col3 = st.columns(3)
         with col1:
-            event_summary_df = calculate_event_summary_with_outside_events(
-                game_histories, tickets, game_events
-            )
+            event_summary_df = engine.get("event_summary")
             st.subheader("Tickets e Partidas por Evento")
             st.dataframe(event_summary_df)
 
         with col2:
-            orders_summary_df = calculate_orders_by_event(
-                process_json_data(data.get("orders", []), "orders"), game_events
-            )
+            orders_summary_df = engine.get("orders_summary")
             st.subheader("Orders por Evento")
             st.dataframe(orders_summary_df)
 
         with col3:
-            unique_order_values_summary_df = calculate_unique_order_values_by_event(
-                process_json_data(data.get("orders", []), "orders"), game_events
-            )
+            unique_order_values_summary_df = engine.get("unique_order_values")
             st.subheader("Valores e Compras por Evento")
             st.dataframe(unique_order_values_summary_df)
     except Exception as e:
         st.error(f"Erro ao calcular tabelas de resumo: {e}")
 
+    # Percentis e usuários distintos (sketches mergeáveis por dia × jogo)
+    st.header("Percentis de Tickets e Orders")
+    try:
+        sketch_grouping = st.radio("Agrupar por:", ["Evento", "Mês"], horizontal=True, key="sketch_grouping")
+        sketch_by = "event" if sketch_grouping == "Evento" else "month"
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Valor dos Tickets")
+            st.dataframe(summarize_sketches(engine.get("ticket_sketches"), by=sketch_by))
+        with col2:
+            st.subheader("Valor das Orders (R$)")
+            st.dataframe(summarize_sketches(engine.get("order_sketches"), by=sketch_by))
+        st.caption("Usuários distintos estimados com HyperLogLog (erro ~1,6%) e percentis com KLL (erro de rank ~1,65%).")
+    except Exception as e:
+        st.error(f"Erro ao calcular percentis: {e}")
+
     # Heavy Users
     # Seção: Heavy Users da Monaco
 st.header("Top Heavy Users")
@@ -186,7 +243,7 @@ try:
 
     with col1:
         st.subheader("Top 30 Heavy Users")
-        top_heavy_users_df = calculate_top_heavy_users(game_histories, users)
+        top_heavy_users_df = engine.get("top_heavy_users")
         st.dataframe(top_heavy_users_df.style.set_table_styles([
             {'selector': 'thead th', 'props': [('background-color', '#372779'), ('color', 'white')]},
             {'selector': 'tbody tr:nth-child(even)', 'props': [('background-color', '#f9f9f9')]},
@@ -196,9 +253,7 @@ try:
     with col2:
         natal_event_name = "Campeonato Season 6 - Natal"
         st.subheader(f"Top 10 Heavy Users - {natal_event_name}")
-        top_users_natal_df = calculate_top_users_event_summary(
-            game_histories, users, natal_event_name, "2024-12-13", "2024-12-24", top_n=10
-        )
+        top_users_natal_df = engine.get("top_users_natal")
         st.dataframe(top_users_natal_df.style.set_table_styles([
             {'selector': 'thead th', 'props': [('background-color', '#372779'), ('color', 'white')]},
             {'selector': 'tbody tr:nth-child(even)', 'props': [('background-color', '#f9f9f9')]},
@@ -208,10 +263,88 @@ try:
 except Exception as e:
     st.error(f"Erro ao processar usuários: {e}")
 
-        # Carregar JSON de competições
+# Seção: Usuários com taxa de tickets implausível
+st.header("Anomalias de Tickets")
+
 try:
-    with open("data/competitions_gameroom.json") as f:
-        competitions_data = json.load(f)["competitions"]
+    ticket_flags = engine.get("ticket_anomalies").flags()
+    if ticket_flags.empty:
+        st.info("Nenhum usuário sinalizado.")
+    else:
+        nicknames = engine.tables["users"].set_index("_id")["nickname"]
+        ticket_flags.insert(1, "Nickname", ticket_flags["Usuário"].map(nicknames))
+        st.write(f"{ticket_flags['Usuário'].nunique()} usuários sinalizados em {len(ticket_flags)} intervalos.")
+        st.dataframe(ticket_flags, height=400)
+except Exception as e:
+    st.error(f"Erro ao detectar anomalias de tickets: {e}")
+
+# Seção: Economia de Fichas (extrato reconstruído por usuário)
+st.header("Economia de Fichas")
+
+try:
+    coin_economy = engine.get("coin_economy")
+    players = coin_economy[coin_economy["Partidas"] > 0]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Consumo Mediano (fichas/dia ativo)", f"{players['Consumo por Dia Ativo'].median():.2f}".replace(".", ","))
+    with col2:
+        st.metric("Jogadores que Zeraram o Saldo", f"{(players['Vezes que Zerou'] > 0).mean() * 100:.1f}%".replace(".", ","))
+    with col3:
+        st.metric("Tempo Mediano até Zerar", format_duration(players["Tempo Mediano até Zerar (h)"].median() * 3600))
+    with col4:
+        returned = (coin_economy["Retorno após Renovação (%)"] * coin_economy["Renovações"]).sum() / 100
+        st.metric("Retorno em 24h após Renovação", f"{returned / coin_economy['Renovações'].sum() * 100:.1f}%".replace(".", ","))
+
+    st.subheader("Usuários que Mais Zeraram o Saldo")
+    nicknames = engine.tables["users"].set_index("_id")["nickname"]
+    top_depleted = players.sort_values("Vezes que Zerou", ascending=False).head(30)
+    top_depleted.insert(0, "Nickname", top_depleted.index.map(nicknames))
+    st.dataframe(top_depleted, height=400)
+except Exception as e:
+    st.error(f"Erro ao calcular a economia de fichas: {e}")
+
+# Seção: Histórico do Jogador (busca por nickname/email e histórico completo)
+st.header("Histórico do Jogador")
+
+try:
+    player_index = engine.get("player_index")
+    player_query = st.text_input("Buscar por nickname ou email:", key="player_search")
+    candidates = player_index.search(player_query, limit=20)
+    if player_query and candidates.empty:
+        st.info("Nenhum usuário encontrado.")
+    elif not candidates.empty:
+        labels = {
+            row.userId: f"{row.nickname if isinstance(row.nickname, str) else '(sem nickname)'} - {row.email}"
+            for row in candidates.itertuples()
+        }
+        selected_player = st.selectbox("Jogador:", list(labels), format_func=labels.get, key="player_selectbox")
+
+        player_counts = player_index.counts(selected_player)
+        player_tickets = player_index.history(selected_player, "tickets")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Partidas", player_counts["game_histories"])
+        with col2:
+            st.metric("Tickets", f"{player_tickets['amount'].sum():,.0f}".replace(",", "."))
+        with col3:
+            st.metric("Orders", player_counts["orders"])
+        with col4:
+            st.metric("Notificações", player_counts["notifications"])
+
+        for tab, table in zip(st.tabs(["Partidas", "Tickets", "Orders", "Notificações"]), HISTORY_TABLES):
+            with tab:
+                st.dataframe(player_index.history(selected_player, table), height=300, use_container_width=True)
+except Exception as e:
+    st.error(f"Erro ao carregar o histórico do jogador: {e}")
+
+# Carregar JSON de competições (processado uma única vez por versão do arquivo)
+@st.cache_resource
+def get_competition_panel(file_path, mtime):
+    return CompetitionPanel.from_file(file_path)
+
+COMPETITIONS_FILE = f"{DATA_DIR}competitions_gameroom.json"
+try:
+    competition_panel = get_competition_panel(COMPETITIONS_FILE, os.path.getmtime(COMPETITIONS_FILE))
 except FileNotFoundError:
     st.error("Arquivo 'competitions_gameroom.json' não encontrado no diretório 'data/'.")
     st.stop()
@@ -222,31 +355,90 @@ except KeyError:
 # Título do Dashboard
 st.title("Análises de Engajamento por Competição")
 
-# Obter nomes das competições
-competition_names = [comp["competition"] for comp in competitions_data]
-
 # Adicionar seletor de competição com uma chave única
 selected_competition = st.selectbox(
-    "Selecione uma competição:", competition_names, key="competition_selectbox"
+    "Selecione uma competição:", competition_panel.names, key="competition_selectbox"
 )
 
-# Filtrar dados da competição selecionada
-selected_data = next(comp for comp in competitions_data if comp["competition"] == selected_competition)
-
-# Processar dados da competição
-competition_df = process_competition_data(selected_data)
-
-# Obter o valor de total_average_period
-total_average_period = selected_data["engagement_data"]["total_period"].get("total_average_period", "N/A")
-
-# Criar gráfico de engajamento
-engagement_graph = create_engagement_graph(competition_df, selected_competition)
+# Obter o valor de total_average_period e o gráfico de engajamento (memoizado)
+total_average_period = competition_panel.total_average_period(selected_competition)
+engagement_graph = competition_panel.engagement_graph(selected_competition)
 
 # Exibir cabeçalho, gráfico e total_average_period
 # st.header(f"Average Time - {selected_competition}")
-st.metric("Tempo Médio de Tela da Competição", total_average_period)  # Exibe o valor como métrica
+st.metric("Tempo Médio de Tela da Competição (planilha)", total_average_period)  # Exibe o valor como métrica
 st.plotly_chart(engagement_graph, key=f"plotly_chart_{selected_competition}")
 
+# Métricas de sessão calculadas a partir do histórico de partidas
+try:
+    sessions = engine.get("sessions")
+    period = competition_panel.periods.loc[selected_competition]
+    windows = pd.DataFrame(
+        {"start": [period["before_start"], period["start"]], "end": [period["before_end"], period["end"]]},
+        index=["Antes da Competição", "Competição"],
+    )
+    window_metrics = window_session_metrics(sessions, windows)
+
+    st.subheader("Sessões Calculadas (histórico de partidas)")
+    col1, col2, col3 = st.columns(3)
+    if "Competição" in window_metrics.index:
+        competition_metrics = window_metrics.loc["Competição"]
+        with col1:
+            st.metric("Tempo Médio de Tela por Usuário/Dia", format_duration(
+                competition_metrics["Tempo de Tela (s)"] / competition_metrics["Usuários"]
+                / ((period["end"] - period["start"]).days + 1)
+            ))
+        with col2:
+            st.metric("Duração Média da Sessão", format_duration(competition_metrics["Duração Média da Sessão (s)"]))
+        with col3:
+            st.metric("Partidas por Sessão", f"{competition_metrics['Partidas por Sessão']:.2f}".replace(".", ","))
+
+    daily_metrics = daily_session_metrics(sessions)
+    competition_days = competition_panel.competition(selected_competition)["date"]
+    st.line_chart(daily_metrics.loc[
+        competition_days.min():competition_days.max(),
+        ["Tempo Médio por Usuário (s)", "Duração Média da Sessão (s)"],
+    ])
+    st.dataframe(window_metrics)
+except Exception as e:
+    st.error(f"Erro ao calcular sessões: {e}")
+
+# Comparação entre competições
+compared_competitions = st.multiselect(
+    "Comparar competições:", competition_panel.names, default=competition_panel.names, key="competition_comparison"
+)
+if compared_competitions:
+    st.plotly_chart(competition_panel.comparison_graph(compared_competitions), key="plotly_chart_comparison")
+
+# Projeções por cenário (grade completa de clientes × adesão × semanas × jogos)
+st.header("Projeções por Cenário")
+try:
+    projection_stats = engine.get("projection_stats")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        scenario_clients = st.multiselect(
+            "Quantidade de Clientes", [10000, 20000, 40000, 50000, 100000], default=[40000]
+        )
+    with col2:
+        scenario_percentages = st.slider("Percentual de Clientes que Jogarão (%)", 1, 100, (10, 50), step=1)
+    with col3:
+        scenario_weeks = st.slider("Duração da Gamificação (semanas)", 1, 52, (4, 12), step=1)
+
+    scenario_grid = evaluate_projection_grid(
+        projection_stats,
+        scenario_clients,
+        range(scenario_percentages[0], scenario_percentages[1] + 1),
+        range(scenario_weeks[0], scenario_weeks[1] + 1),
+    )
+    st.caption(
+        f"{len(scenario_grid):,} cenários avaliados. Heavy users: mais de "
+        f"{projection_stats['heavy_user_threshold']:.0f} partidas no histórico.".replace(",", ".")
+    )
+    st.dataframe(scenario_grid, height=400)
+except Exception as e:
+    st.error(f"Erro ao calcular projeções por cenário: {e}")
+
 # Projeções para clientes da Claro
 # st.header("Projeções para a Claro")
 # st.write("Realize projeções exclusivas para clientes da Claro com base nos dados históricos e estimativas.")
@@ -2,17 +2,28 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+from src.partitions import unwrap_extended_json
+from src.projection import GAME_NAMES, build_projection_stats, evaluate_projection_grid, game_percentages
+from src.timebuckets import TIMEZONE, bucket_labels, time_buckets
+
 def plot_game_distribution(ticket_distribution):
     fig = px.bar(ticket_distribution, x=ticket_distribution.index, y="amount", title="Distribuição de Tickets")
     fig.update_layout(xaxis_title="Jogos", yaxis_title="Quantidade de Tickets")
     st.plotly_chart(fig)
 
 def process_json_data(data, data_type):
+    # Dumps BSON (src.data_loader.load_bson_file) já chegam com colunas tipadas; só
+    # createdAt gravado como epoch em ms (ex.: gamehistories) precisa ser convertido
+    if isinstance(data, pd.DataFrame):
+        if "createdAt" in data.columns and pd.api.types.is_numeric_dtype(data["createdAt"]):
+            return data.assign(createdAt=pd.to_datetime(data["createdAt"], unit="ms"))
+        return data
     df = pd.DataFrame(data)
     if "createdAt" in df.columns:
-        df["createdAt"] = df["createdAt"].apply(
-            lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x, unit="ms")
-        )
+        # Extrai o epoch em ms de cada linha e converte a coluna de uma vez (pd.to_datetime
+        # linha a linha dominava o carregamento das tabelas)
+        millis = [x["$date"]["$numberLong"] if isinstance(x, dict) else x for x in df["createdAt"]]
+        df["createdAt"] = pd.to_datetime(pd.to_numeric(pd.Series(millis, index=df.index)), unit="ms")
     if "amount" in df.columns and data_type == "tickets":
         df["amount"] = df["amount"].apply(lambda x: int(x["$numberInt"]) if isinstance(x, dict) else x)
     if "_id" in df.columns:
@@ -22,18 +33,18 @@ def process_json_data(data, data_type):
     return df
 
 # Análise Crescimento Partidas, Tickets e Usuários
-def analyze_growth(game_histories, tickets, users):
-    game_histories["month"] = game_histories["createdAt"].dt.to_period("M")
-    tickets["month"] = tickets["createdAt"].dt.to_period("M")
-    users["month"] = users["createdAt"].dt.to_period("M")
+def analyze_growth(game_histories, tickets, users, granularity="month", tz=TIMEZONE):
+    games_month = time_buckets(game_histories["createdAt"], granularity, tz)
+    tickets_month = time_buckets(tickets["createdAt"], granularity, tz)
+    users_month = time_buckets(users["createdAt"], granularity, tz)
 
-    games_per_month = game_histories["month"].value_counts().sort_index()
-    total_tickets_amount = tickets.groupby("month")["amount"].sum().sort_index()
-    users_per_month = users["month"].value_counts().sort_index()
+    games_per_month = games_month.value_counts().sort_index()
+    total_tickets_amount = tickets["amount"].groupby(tickets_month).sum().sort_index()
+    users_per_month = users_month.value_counts().sort_index()
 
-    games_per_month.index = games_per_month.index.astype(str)
-    total_tickets_amount.index = total_tickets_amount.index.astype(str)
-    users_per_month.index = users_per_month.index.astype(str)
+    games_per_month.index = bucket_labels(games_per_month.index, granularity)
+    total_tickets_amount.index = bucket_labels(total_tickets_amount.index, granularity)
+    users_per_month.index = bucket_labels(users_per_month.index, granularity)
 
     return games_per_month, total_tickets_amount, users_per_month
 
@@ -48,16 +59,16 @@ def calculate_game_distribution(tickets):
     })
     return ticket_distribution
 
-def calculate_tickets_by_game_and_month(tickets):
-    tickets["month"] = tickets["createdAt"].dt.to_period("M")
-    tickets_by_game_and_month = tickets.groupby(["month", "gameId"])["amount"].sum().unstack(fill_value=0)
+def calculate_tickets_by_game_and_month(tickets, granularity="month", tz=TIMEZONE):
+    month = time_buckets(tickets["createdAt"], granularity, tz)
+    tickets_by_game_and_month = tickets["amount"].groupby([month, tickets["gameId"]]).sum().unstack(fill_value=0)
     tickets_by_game_and_month.columns = tickets_by_game_and_month.columns.map({
         "1": "The Runner",
         "2": "Day One",
         "3": "Lava Rush",
         "4": "Super Monaco"
     })
-    tickets_by_game_and_month.index = tickets_by_game_and_month.index.astype(str)
+    tickets_by_game_and_month.index = bucket_labels(tickets_by_game_and_month.index, granularity)
     return tickets_by_game_and_month
 
 # Cálculo de tickets por nível
@@ -71,49 +82,54 @@ def calculate_tickets_by_level(total_tickets):
     tickets_by_level = {level: total_tickets * pct for level, pct in level_distribution.items()}
     return tickets_by_level
 
-def project_client_metrics(game_histories, tickets, num_clients, weeks, base_percentage, selected_games):
-    adjusted_clients = num_clients * (base_percentage / 100)
-    selected_game_ids = {
-        "The Runner": "1",
-        "Day One": "2",
-        "Lava Rush": "3",
-        "Super Monaco": "4",
-    }
-    selected_game_ids = [selected_game_ids[game] for game in selected_games]
+def project_client_metrics(game_histories, tickets, num_clients, weeks, base_percentage, selected_games, stats=None):
+    """
+    Projeta partidas e tickets para um único cenário de clientes.
 
-    filtered_games = game_histories[game_histories["gameId"].isin(selected_game_ids)]
-    filtered_tickets = tickets[tickets["gameId"].isin(selected_game_ids)]
+    :param stats: Estatísticas pré-calculadas por build_projection_stats (opcional).
+    :return: Tupla (partidas, tickets, média de partidas por usuário, média de tickets por usuário, percentuais por jogo).
+    """
+    if stats is None:
+        stats = build_projection_stats(game_histories, tickets)
 
-    if filtered_games.empty or filtered_tickets.empty:
+    # Sem partidas ou sem tickets dos jogos selecionados não há projeção
+    indexes = [GAME_NAMES.index(game) for game in selected_games]
+    if stats["game_counts"][:, indexes].sum() == 0 or stats["ticket_counts"][:, indexes].sum() == 0:
         return 0, 0, 0, 0, {}
 
-    avg_games_per_user = filtered_games.shape[0] / filtered_games["userId"].nunique() if filtered_games["userId"].nunique() > 0 else 0
-    avg_ticket_value_per_user = filtered_tickets["amount"].sum() / filtered_tickets["user"].nunique() if filtered_tickets["user"].nunique() > 0 else 0
-
-    total_games = avg_games_per_user * adjusted_clients * weeks
-    total_tickets = avg_ticket_value_per_user * adjusted_clients * weeks
+    scenario = evaluate_projection_grid(stats, [num_clients], [base_percentage], [weeks], [selected_games]).iloc[0]
 
-    game_percentage = {}
-    for game in selected_games:
-        game_id = selected_game_ids[selected_games.index(game)]
-        game_games = filtered_games[filtered_games["gameId"] == game_id].shape[0]
-        game_tickets = filtered_tickets[filtered_tickets["gameId"] == game_id]["amount"].sum()
+    return (
+        scenario["Partidas Estimadas"],
+        scenario["Tickets Estimados"],
+        scenario["Média de Partidas por Usuário"],
+        scenario["Média de Tickets por Usuário"],
+        game_percentages(stats, selected_games),
+    )
 
-        game_percentage[game] = (
-            (game_games / filtered_games.shape[0]) * 100 if filtered_games.shape[0] > 0 else 0,
-            (game_tickets / filtered_tickets["amount"].sum()) * 100 if filtered_tickets["amount"].sum() > 0 else 0,
+def _event_dates(game_events, unit="ms"):
+    """
+    Retorna as datas de início e fim dos eventos como Timestamps, sem alterar game_events.
+    """
+    return tuple(
+        game_events[column] if pd.api.types.is_datetime64_any_dtype(game_events[column]) else game_events[column].apply(
+            lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x, unit=unit)
         )
+        for column in ("startDate", "endDate")
+    )
 
-    return total_games, total_tickets, avg_games_per_user, avg_ticket_value_per_user, game_percentage
+def _order_amounts(amounts):
+    """
+    Valores de totalAmount como float, com qualquer wrapper do Extended JSON ($numberDouble,
+    $numberInt...) removido: o resultado é o mesmo com as orders brutas ou já normalizadas
+    (armazenamento particionado, conjunto compartilhado, dumps BSON).
+    """
+    return pd.to_numeric(amounts.map(unwrap_extended_json), errors="coerce").fillna(0.0).astype(float)
 
 # Distribuição Tickets por Jogos fora de Eventos(Campeonatos)
 def calculate_event_summary_with_outside_events(game_histories, tickets, game_events):
-    game_events["startDate"] = game_events["startDate"].apply(
-        lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x, unit="ms")
-    )
-    game_events["endDate"] = game_events["endDate"].apply(
-        lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x, unit="ms")
-    )
+    start_dates, end_dates = _event_dates(game_events)
+    game_events = game_events.assign(startDate=start_dates, endDate=end_dates)
 
     event_summary = []
 
@@ -199,18 +215,12 @@ def calculate_orders_by_event(orders, game_events):
     :return: DataFrame com o resumo de Orders por evento.
     """
     # Processar datas de início e fim dos eventos
-    game_events["startDate"] = game_events["startDate"].apply(
-        lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x, unit="ms")
-    )
-    game_events["endDate"] = game_events["endDate"].apply(
-        lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x, unit="ms")
-    )
+    start_dates, end_dates = _event_dates(game_events)
+    game_events = game_events.assign(startDate=start_dates, endDate=end_dates)
 
     # Processar o campo totalAmount para garantir que esteja numérico
     if "totalAmount" in orders.columns:
-        orders["totalAmount"] = orders["totalAmount"].apply(
-            lambda x: float(x["$numberDouble"]) if isinstance(x, dict) and "$numberDouble" in x else float(x) if isinstance(x, (int, float)) else 0.0
-        )
+        orders = orders.assign(totalAmount=_order_amounts(orders["totalAmount"]))
 
     # Filtrar apenas Orders com pagamento "paid"
     orders = orders[orders["paymentStatus"] == "paid"]
@@ -281,17 +291,11 @@ def calculate_unique_order_values_by_event(orders, game_events):
     :param game_events: DataFrame de eventos de jogos.
     :return: DataFrame com resumo de valores únicos e quantidades por evento.
     """
-    game_events["startDate"] = game_events["startDate"].apply(
-        lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x)
-    )
-    game_events["endDate"] = game_events["endDate"].apply(
-        lambda x: pd.to_datetime(x["$date"]["$numberLong"], unit="ms") if isinstance(x, dict) else pd.to_datetime(x)
-    )
+    start_dates, end_dates = _event_dates(game_events, unit=None)
+    game_events = game_events.assign(startDate=start_dates, endDate=end_dates)
 
     # Garantir que o campo totalAmount está em formato numérico
-    orders["totalAmount"] = orders["totalAmount"].apply(
-        lambda x: float(x["$numberDouble"]) if isinstance(x, dict) and "$numberDouble" in x else float(x) if isinstance(x, (int, float)) else 0.0
-    )
+    orders = orders.assign(totalAmount=_order_amounts(orders["totalAmount"]))
 
     summary = []
 
@@ -335,7 +339,7 @@ def calculate_top_heavy_users(game_histories, users, top_n=30):
 
     # Processar campo _id no DataFrame de usuários
     if "_id" in users.columns:
-        users["_id"] = users["_id"].apply(lambda x: x.get("$oid") if isinstance(x, dict) else x)
+        users = users.assign(_id=users["_id"].apply(lambda x: x.get("$oid") if isinstance(x, dict) else x))
 
     # Mesclar com informações dos usuários
     user_game_counts = user_game_counts.merge(users, left_on="userId", right_on="_id", how="left")
@@ -370,7 +374,7 @@ def calculate_top_users_event_summary(game_histories, users, event_name, start_d
     ]
 
     # Adicionar a coluna 'date' ao DataFrame de partidas
-    filtered_games["date"] = filtered_games["createdAt"].dt.date
+    filtered_games = filtered_games.assign(date=filtered_games["createdAt"].dt.date)
 
     # Contar partidas por usuário, jogo e data
     user_game_counts = filtered_games.groupby(["userId", "gameId", "date"]).size().reset_index(name="Partidas Por Dia")
@@ -388,7 +392,7 @@ def calculate_top_users_event_summary(game_histories, users, event_name, start_d
 
     # Mesclar com informações dos usuários
     if "_id" in users.columns:
-        users["_id"] = users["_id"].apply(lambda x: x.get("$oid") if isinstance(x, dict) else x)
+        users = users.assign(_id=users["_id"].apply(lambda x: x.get("$oid") if isinstance(x, dict) else x))
 
     user_game_counts = user_game_counts.merge(users, left_on="userId", right_on="_id", how="left")
 
@@ -413,9 +417,7 @@ def process_competition_data(competition):
     df = pd.DataFrame(daily_data)
 
     # Converter total_average_time para segundos
-    df["total_average_time_segundos"] = df["total_average_time"].apply(
-        lambda x: sum(int(part) * 60 ** i for i, part in enumerate(reversed(x.split(":"))))
-    )
+    df["total_average_time_segundos"] = pd.to_timedelta(df["total_average_time"]).dt.total_seconds().astype(int)
     return df
 
 def create_engagement_graph(dataframe, competition_name):
@@ -433,18 +435,14 @@ def create_engagement_graph(dataframe, competition_name):
         },
         markers=True
     )
-    # Adicionar anotações para observações
-    for _, row in dataframe.iterrows():
-        if row["observations"]:
-            fig.add_annotation(
-                x=row["date"],
-                y=row["total_average_time_segundos"],
-                text=row["observations"],
-                showarrow=True,
-                arrowhead=1,
-                ax=0,
-                ay=-30
-            )
+    # Adicionar anotações para observações (todas de uma vez)
+    annotated = dataframe[dataframe["observations"].fillna("").astype(bool)]
+    fig.update_layout(annotations=[
+        dict(x=date, y=seconds, text=text, showarrow=True, arrowhead=1, ax=0, ay=-30)
+        for date, seconds, text in zip(
+            annotated["date"], annotated["total_average_time_segundos"], annotated["observations"]
+        )
+    ])
     return fig
 
 # Distribuição de Gênero e Idade
@@ -0,0 +1,212 @@
+"""
+API HTTP (JSON) sobre as funções de análise, para o dashboard Next.js e outros consumidores.
+
+Uso:
+    python -m src.api --port 8888 --data-dir data/ --shared-dir store/shared/
+
+As respostas são servidas com gzip, ETag/If-None-Match e um cache em memória indexado
+pela versão dos dados: enquanto os arquivos de data/ não mudam, cada rota é calculada
+uma única vez e as demais requisições recebem a resposta pronta.
+"""
+import argparse
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+import tornado.ioloop
+import tornado.web
+from cachetools import LRUCache
+
+from src.player_index import HISTORY_TABLES
+from src.projection import GAME_NAMES, evaluate_projection_grid
+from src.refresh import RefreshEngine
+
+# Intervalo (em segundos) entre verificações de mudanças em data/
+REFRESH_INTERVAL = 30
+
+
+def to_jsonable(value):
+    """
+    Converte resultados das análises (DataFrames, Series, tipos numpy) em estruturas JSON.
+    """
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient="records", date_format="iso", force_ascii=False))
+    if isinstance(value, pd.Series):
+        return json.loads(value.to_json(date_format="iso", force_ascii=False))
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _int_list(argument, default):
+    return [int(value) for value in argument.split(",") if value] if argument else default
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, engine, cache):
+        self.engine = engine
+        self.cache = cache
+
+    def build(self):
+        raise NotImplementedError
+
+    def compute_etag(self):
+        # O ETag é definido explicitamente a partir da resposta em cache
+        return None
+
+    def get(self):
+        # Versão e resultados lidos do mesmo snapshot: uma atualização em andamento não
+        # publica nada até terminar, então a resposta nunca é guardada sob a versão errada
+        self.snapshot = self.engine.snapshot()
+        query = tuple(sorted((name, tuple(values)) for name, values in self.request.query_arguments.items()))
+        key = (self.request.path, query, self.snapshot.version)
+        if key not in self.cache:
+            try:
+                payload = to_jsonable(self.build())
+            except KeyError as e:
+                raise tornado.web.HTTPError(503, reason=f"Dados indisponíveis: {e}")
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, reason=str(e))
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.cache[key] = (f'"{hashlib.sha1(body).hexdigest()}"', body)
+
+        etag, body = self.cache[key]
+        self.set_header("ETag", etag)
+        self.set_header("Cache-Control", "no-cache")
+        if etag in self.request.headers.get("If-None-Match", ""):
+            self.set_status(304)
+            return
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(body)
+
+
+class VersionHandler(BaseHandler):
+    def build(self):
+        return {"data_version": self.snapshot.version}
+
+
+class GrowthHandler(BaseHandler):
+    def build(self):
+        games_per_month, total_tickets_amount, users_per_month = self.snapshot.get("growth")
+        return {
+            "games_per_month": games_per_month,
+            "tickets_per_month": total_tickets_amount,
+            "users_per_month": users_per_month,
+            "tickets_by_game": self.snapshot.get("game_distribution"),
+            "tickets_by_game_and_month": self.snapshot.get("tickets_by_game_and_month").reset_index(),
+        }
+
+
+class EventsHandler(BaseHandler):
+    def build(self):
+        return self.snapshot.get("event_summary")
+
+
+class OrdersHandler(BaseHandler):
+    def build(self):
+        return {
+            "by_event": self.snapshot.get("orders_summary"),
+            "unique_values": self.snapshot.get("unique_order_values"),
+        }
+
+
+class LeaderboardHandler(BaseHandler):
+    def build(self):
+        if self.get_query_argument("event", "all") == "natal":
+            return self.snapshot.get("top_users_natal")
+        top_n = int(self.get_query_argument("top_n", "30"))
+        return self.snapshot.get("top_heavy_users").head(top_n)
+
+
+class AnomaliesHandler(BaseHandler):
+    def build(self):
+        return self.snapshot.get("ticket_anomalies").flags()
+
+
+class CoinsHandler(BaseHandler):
+    def build(self):
+        return self.snapshot.get("coin_economy").reset_index()
+
+
+class PlayerSearchHandler(BaseHandler):
+    def build(self):
+        return self.snapshot.get("player_index").search(self.get_query_argument("q", ""), limit=int(self.get_query_argument("limit", "10")))
+
+
+class PlayerHistoryHandler(BaseHandler):
+    def build(self):
+        player_index = self.snapshot.get("player_index")
+        user_id = self.get_query_argument("id", "")
+        return {table: player_index.history(user_id, table) for table in HISTORY_TABLES}
+
+
+class ProjectionsHandler(BaseHandler):
+    def build(self):
+        games = self.get_query_argument("games", "")
+        subsets = None
+        if games:
+            selected = [game.strip() for game in games.split(",")]
+            unknown = set(selected) - set(GAME_NAMES)
+            if unknown:
+                raise ValueError(f"Jogos desconhecidos: {sorted(unknown)}")
+            subsets = [selected]
+        return evaluate_projection_grid(
+            self.snapshot.get("projection_stats"),
+            _int_list(self.get_query_argument("clients", ""), [40000]),
+            _int_list(self.get_query_argument("percentages", ""), [30]),
+            _int_list(self.get_query_argument("weeks", ""), [8]),
+            subsets,
+        )
+
+
+def make_app(engine, cache_size=256):
+    cache = LRUCache(maxsize=cache_size)
+    handler_args = {"engine": engine, "cache": cache}
+    return tornado.web.Application(
+        [
+            (r"/api/version", VersionHandler, handler_args),
+            (r"/api/growth", GrowthHandler, handler_args),
+            (r"/api/events", EventsHandler, handler_args),
+            (r"/api/orders", OrdersHandler, handler_args),
+            (r"/api/leaderboard", LeaderboardHandler, handler_args),
+            (r"/api/anomalies", AnomaliesHandler, handler_args),
+            (r"/api/coins", CoinsHandler, handler_args),
+            (r"/api/players", PlayerSearchHandler, handler_args),
+            (r"/api/player", PlayerHistoryHandler, handler_args),
+            (r"/api/projections", ProjectionsHandler, handler_args),
+        ],
+        compress_response=True,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON do Monaco Dashboard")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--data-dir", default="data/")
+    parser.add_argument("--store-dir", default=None)
+    parser.add_argument("--shared-dir", default=None, help="Tabelas Arrow compartilhadas com o dashboard")
+    parser.add_argument("--processes", type=int, default=0, help="Processos para decodificar as tabelas (0 = apenas threads)")
+    args = parser.parse_args()
+
+    engine = RefreshEngine(args.data_dir, store_dir=args.store_dir, shared_dir=args.shared_dir, processes=args.processes)
+    engine.refresh()
+
+    app = make_app(engine)
+    app.listen(args.port)
+    print(f"API disponível em http://localhost:{args.port}/api/")
+
+    # Verifica mudanças em data/ periodicamente, fora do loop de eventos
+    loop = tornado.ioloop.IOLoop.current()
+    tornado.ioloop.PeriodicCallback(
+        lambda: loop.run_in_executor(None, engine.refresh), REFRESH_INTERVAL * 1000
+    ).start()
+    loop.start()
+
+
+if __name__ == "__main__":
+    main()
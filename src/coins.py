@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from src.partitions import unwrap_extended_json
+from src.timebuckets import TIMEZONE, time_buckets
+
+# Fichas recebidas no cadastro e a cada renovação
+DAILY_COINS = 3
+# Notificações enviadas quando as fichas do usuário são renovadas
+RENEWAL_MESSAGE_PREFIX = "Suas fichas foram renovadas"
+# Janela para considerar que o usuário voltou a jogar após uma renovação
+REENGAGEMENT_HOURS = 24
+
+# Tipos de evento do extrato, na ordem de aplicação quando têm o mesmo horário
+SIGNUP, RENEWAL, PURCHASE, MATCH = 0, 1, 2, 3
+EVENT_NAMES = {SIGNUP: "Cadastro", RENEWAL: "Renovação", PURCHASE: "Compra", MATCH: "Partida"}
+
+MS_PER_HOUR = 3_600_000
+
+
+def coin_purchases(orders, products):
+    """
+    Fichas compradas em cada order paga (coinsAmount do produto × quantidade).
+
+    :return: DataFrame com userId, createdAt e coins.
+    """
+    paid = orders[orders["paymentStatus"] == "paid"]
+    items = paid["items"].map(unwrap_extended_json).explode().dropna()
+    if items.empty:
+        return pd.DataFrame({"userId": pd.Series(dtype=object), "createdAt": pd.Series(dtype="datetime64[ns]"), "coins": pd.Series(dtype=float)})
+
+    items = pd.DataFrame(items.tolist(), index=items.index)
+    coins_per_product = pd.Series(
+        products["coinsAmount"].map(unwrap_extended_json).to_numpy(dtype=float),
+        index=products["_id"].map(unwrap_extended_json),
+    )
+    coins = items["product"].map(coins_per_product).fillna(0) * pd.to_numeric(items["quantity"]).fillna(1)
+    coins = coins.groupby(level=0).sum()
+    return pd.DataFrame({
+        "userId": paid.loc[coins.index, "user"].map(unwrap_extended_json).to_numpy(),
+        "createdAt": paid.loc[coins.index, "createdAt"].to_numpy(),
+        "coins": coins.to_numpy(),
+    })
+
+
+def _grouped_cumsum(values, group_starts, group_ids):
+    # Soma acumulada que reinicia a cada grupo (linhas já ordenadas por grupo)
+    total = np.cumsum(values)
+    return total - (total[group_starts] - values[group_starts])[group_ids]
+
+
+def build_coin_ledger(game_histories, notifications, users, purchases=None, daily_coins=DAILY_COINS):
+    """
+    Reconstrói o extrato de fichas de cada usuário ao longo do tempo.
+
+    O saldo tem duas carteiras: a cota (daily_coins, restaurada no cadastro e a cada
+    renovação) e as fichas compradas. Cada partida gasta primeiro a cota e depois as
+    fichas compradas. Tudo é calculado com uma única ordenação e somas acumuladas por
+    usuário e por período entre renovações, sem laços por usuário.
+
+    :param game_histories: Partidas (userId, createdAt, coinsUsed).
+    :param notifications: Notificações (userId, message, createdAt); as de renovação
+        marcam o início de um novo período.
+    :param users: Usuários (_id, createdAt = cadastro).
+    :param purchases: Compras de fichas (userId, createdAt, coins), ex.: coin_purchases.
+    :param daily_coins: Cota de fichas do cadastro e de cada renovação.
+    :return: DataFrame com um evento por linha, ordenado por usuário e horário: userId,
+        createdAt, event, coins (+ crédito / - gasto), allowance, purchased, balance,
+        depleted (partida que levou um saldo positivo a zero), unexplained (fichas gastas além dos
+        créditos conhecidos) e period (período entre renovações).
+    """
+    renewals = notifications[notifications["message"].str.startswith(RENEWAL_MESSAGE_PREFIX, na=False)]
+    if purchases is None:
+        purchases = pd.DataFrame({"userId": [], "createdAt": pd.Series(dtype="datetime64[ns]"), "coins": []})
+
+    parts = [
+        (users["_id"].map(unwrap_extended_json), users["createdAt"], SIGNUP, 0),
+        (renewals["userId"], renewals["createdAt"], RENEWAL, 0),
+        (purchases["userId"], purchases["createdAt"], PURCHASE, purchases["coins"]),
+        (game_histories["userId"], game_histories["createdAt"], MATCH, -pd.to_numeric(game_histories["coinsUsed"])),
+    ]
+    user_ids = np.concatenate([part[0].to_numpy(dtype=object) for part in parts])
+    timestamps = np.concatenate([part[1].to_numpy(dtype="datetime64[ms]").astype(np.int64) for part in parts])
+    events = np.concatenate([np.full(len(part[0]), part[2], dtype=np.int8) for part in parts])
+    coins = np.concatenate([np.broadcast_to(np.asarray(part[3], dtype=float), len(part[0])) for part in parts])
+
+    user_codes, user_index = pd.factorize(user_ids)
+    order = np.lexsort((events, timestamps, user_codes))
+    user_codes, timestamps, events, coins = user_codes[order], timestamps[order], events[order], coins[order]
+
+    n = len(order)
+    new_user = np.ones(n, dtype=bool)
+    new_user[1:] = user_codes[1:] != user_codes[:-1]
+    user_starts = np.flatnonzero(new_user)
+    user_ids = np.cumsum(new_user) - 1
+
+    # Períodos: começam no cadastro, em cada renovação e no primeiro evento do usuário
+    new_period = new_user | (events == SIGNUP) | (events == RENEWAL)
+    period_starts = np.flatnonzero(new_period)
+    periods = np.cumsum(new_period) - 1
+
+    spent = np.where(events == MATCH, -coins, 0.0)
+    spent_in_period = _grouped_cumsum(spent, period_starts, periods)
+    allowance = np.maximum(daily_coins - spent_in_period, 0)
+
+    # Gasto além da cota, debitado das fichas compradas
+    overflow = np.maximum(spent_in_period - daily_coins, 0)
+    overflow_step = np.diff(overflow, prepend=0.0)
+    overflow_step[period_starts] = overflow[period_starts]
+    credited = np.where(events == PURCHASE, coins, 0.0)
+    purchased = _grouped_cumsum(credited, user_starts, user_ids) - _grouped_cumsum(overflow_step, user_starts, user_ids)
+
+    balance = allowance + np.maximum(purchased, 0)
+    # Zerar é a transição: partida que leva a zero um saldo que era positivo no evento
+    # anterior do mesmo usuário (partidas com o saldo já zerado não contam de novo)
+    previous_balance = np.concatenate([[0.0], balance[:-1]])
+    previous_balance[user_starts] = 0.0
+    return pd.DataFrame({
+        "userId": user_index[user_codes],
+        "createdAt": pd.to_datetime(timestamps, unit="ms"),
+        "event": pd.Categorical.from_codes(events, categories=list(EVENT_NAMES.values())),
+        "coins": coins,
+        "allowance": allowance,
+        "purchased": np.maximum(purchased, 0),
+        "balance": balance,
+        "depleted": (events == MATCH) & (balance == 0) & (previous_balance > 0),
+        "unexplained": np.maximum(-purchased, 0),
+        "period": periods,
+    })
+
+
+def coin_metrics(ledger, reengagement_hours=REENGAGEMENT_HOURS, tz=TIMEZONE):
+    """
+    Métricas da economia de fichas por usuário.
+
+    :param ledger: Extrato gerado por build_coin_ledger.
+    :param reengagement_hours: Janela (em horas) para contar o retorno após uma renovação.
+    :param tz: Fuso horário dos dias ativos.
+    :return: DataFrame indexado por userId com partidas, fichas gastas e compradas,
+        consumo por dia ativo, vezes e tempo mediano até zerar o saldo, retorno após
+        renovações e saldo estimado.
+    """
+    users = ledger["userId"].to_numpy()
+    timestamps = ledger["createdAt"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    events = ledger["event"].cat.codes.to_numpy()
+    periods = ledger["period"].to_numpy()
+    is_match = events == MATCH
+
+    # Tempo até zerar: do início do período (cadastro/renovação) à primeira partida que zerou
+    period_start_times = timestamps[np.flatnonzero(np.diff(periods, prepend=-1))]
+    depleted_rows = np.flatnonzero(ledger["depleted"].to_numpy())
+    depleted_periods, first = np.unique(periods[depleted_rows], return_index=True)
+    depletion_hours = pd.Series(
+        (timestamps[depleted_rows[first]] - period_start_times[depleted_periods]) / MS_PER_HOUR,
+        index=users[depleted_rows[first]],
+    )
+
+    # Retorno após renovação: próxima partida do mesmo usuário
+    match_rows = np.where(is_match, np.arange(len(ledger)), len(ledger))
+    next_match = np.minimum.accumulate(match_rows[::-1])[::-1]
+    renewal_rows = np.flatnonzero(events == RENEWAL)
+    next_rows = next_match[renewal_rows]
+    has_next = next_rows < len(ledger)
+    has_next[has_next] = users[next_rows[has_next]] == users[renewal_rows[has_next]]
+    return_hours = np.full(len(renewal_rows), np.nan)
+    return_hours[has_next] = (timestamps[next_rows[has_next]] - timestamps[renewal_rows[has_next]]) / MS_PER_HOUR
+    returns = pd.DataFrame({"userId": users[renewal_rows], "hours": return_hours})
+    returns["returned"] = returns["hours"] <= reengagement_hours
+
+    matches = ledger[is_match]
+    by_user = ledger.groupby("userId", sort=True)
+    metrics = pd.DataFrame({
+        "Partidas": matches.groupby("userId").size(),
+        "Fichas Gastas": -matches.groupby("userId")["coins"].sum(),
+        "Fichas Compradas": ledger[events == PURCHASE].groupby("userId")["coins"].sum(),
+        "Dias Ativos": time_buckets(matches["createdAt"], "day", tz).groupby(matches["userId"]).nunique(),
+        "Renovações": returns.groupby("userId").size(),
+        "Vezes que Zerou": ledger["depleted"].groupby(ledger["userId"]).sum(),
+        "Tempo Mediano até Zerar (h)": depletion_hours.groupby(level=0).median(),
+        "Retorno após Renovação (%)": returns.groupby("userId")["returned"].mean() * 100,
+        "Tempo Mediano até Voltar (h)": returns.groupby("userId")["hours"].median(),
+        "Saldo Estimado": by_user["balance"].last(),
+        "Fichas sem Origem": by_user["unexplained"].max(),
+    })
+    counts = ["Partidas", "Fichas Gastas", "Fichas Compradas", "Dias Ativos", "Renovações", "Vezes que Zerou"]
+    metrics[counts] = metrics[counts].fillna(0)
+    metrics["Consumo por Dia Ativo"] = metrics["Fichas Gastas"] / metrics["Dias Ativos"].replace(0, np.nan)
+    metrics.index.name = "userId"
+    return metrics
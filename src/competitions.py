@@ -0,0 +1,104 @@
+import json
+
+import pandas as pd
+import plotly.express as px
+
+from src.analysis import create_engagement_graph
+
+
+def parse_durations(values):
+    """
+    Converte, de forma vetorizada, durações "HH:MM:SS" em segundos (NaN quando ausentes).
+    """
+    return pd.to_timedelta(pd.Series(values, dtype=object), errors="coerce").dt.total_seconds()
+
+
+class CompetitionPanel:
+    """
+    Painel de engajamento com todas as competições de competitions_gameroom.json
+    processadas uma única vez em um DataFrame colunar, indexado pelo nome da competição.
+    """
+
+    def __init__(self, competitions):
+        daily_rows, period_rows = [], []
+        for competition in competitions:
+            name = competition["competition"]
+            engagement = competition["engagement_data"]
+            for daily in engagement["daily"]:
+                daily_rows.append((name, daily["date"], daily["total_average_time"], daily.get("observations", "")))
+            total_period = engagement.get("total_period", {})
+            before = engagement.get("before_competition", {})
+            period_rows.append({
+                "competition": name,
+                "start": total_period.get("start"),
+                "end": total_period.get("end"),
+                "total_average_period": total_period.get("total_average_period", "N/A"),
+                "before_start": before.get("start"),
+                "before_end": before.get("end"),
+                "before_average_time": before.get("total_average_time"),
+            })
+
+        daily = pd.DataFrame(daily_rows, columns=["competition", "date", "total_average_time", "observations"])
+        daily["date"] = pd.to_datetime(daily["date"])
+        daily["total_average_time_segundos"] = parse_durations(daily["total_average_time"])
+
+        periods = pd.DataFrame(period_rows).set_index("competition")
+        periods["start"] = pd.to_datetime(periods["start"])
+        periods["end"] = pd.to_datetime(periods["end"])
+        periods["before_start"] = pd.to_datetime(periods["before_start"])
+        periods["before_end"] = pd.to_datetime(periods["before_end"])
+        periods["total_average_period_segundos"] = parse_durations(periods["total_average_period"]).to_numpy()
+
+        # Dia relativo ao início da competição, para comparar competições lado a lado
+        daily["dia"] = (daily["date"] - daily["competition"].map(periods["start"])).dt.days
+
+        self.daily = daily
+        self.periods = periods
+        self.names = list(periods.index)
+        self._rows = daily.groupby("competition", sort=False).indices
+        self._figures = {}
+
+    @classmethod
+    def from_file(cls, file_path):
+        with open(file_path) as f:
+            return cls(json.load(f)["competitions"])
+
+    def competition(self, name):
+        """
+        Dados diários de uma competição, no mesmo formato de process_competition_data
+        (vazio para competições sem dados diários).
+        """
+        return self.daily.iloc[self._rows.get(name, [])].reset_index(drop=True)
+
+    def total_average_period(self, name):
+        return self.periods.at[name, "total_average_period"]
+
+    def engagement_graph(self, name):
+        """
+        Gráfico de engajamento diário da competição, construído apenas uma vez.
+        """
+        if name not in self._figures:
+            self._figures[name] = create_engagement_graph(self.competition(name), name)
+        return self._figures[name]
+
+    def comparison_graph(self, names):
+        """
+        Compara o engajamento diário de várias competições, alinhadas pelo dia da competição.
+        """
+        key = ("comparison", tuple(names))
+        if key not in self._figures:
+            fig = px.line(
+                self.daily[self.daily["competition"].isin(names)],
+                x="dia",
+                y="total_average_time_segundos",
+                color="competition",
+                title="Comparação de Engajamento entre Competições",
+                labels={
+                    "dia": "Dia da Competição",
+                    "total_average_time_segundos": "Tempo Médio de Tela (segundos)",
+                    "competition": "Competição",
+                },
+                markers=True,
+            )
+            self._figures[key] = fig
+        return self._figures[key]
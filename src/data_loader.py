@@ -1,17 +1,87 @@
 import json
 import os
 
+import bson
+import pandas as pd
+from bson import ObjectId
+
+
+def _plain_value(value):
+    # ObjectIds (inclusive em documentos aninhados, ex.: items das orders) viram texto
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _plain_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain_value(item) for item in value]
+    return value
+
+
+def bson_to_frame(documents):
+    """
+    Converte documentos decodificados de BSON em um DataFrame com colunas tipadas: datas
+    já chegam como datetime64, números como int/float e ObjectIds são convertidos em texto,
+    sem nenhum wrapper do Extended JSON para remover.
+    """
+    frame = pd.DataFrame(documents)
+    for column in frame.columns:
+        if frame[column].dtype != object:
+            continue
+        values = frame[column].dropna()
+        if values.empty:
+            continue
+        if values.map(type).eq(ObjectId).all():
+            frame[column] = frame[column].map(str, na_action="ignore")
+        elif values.map(lambda value: isinstance(value, (dict, list, ObjectId))).any():
+            frame[column] = frame[column].map(_plain_value)
+    return frame
+
+
+def source_path(data_dir, name):
+    """
+    Caminho do arquivo de origem de uma coleção: o dump BSON (mongodump) tem preferência
+    sobre o Extended JSON com o mesmo nome.
+
+    :param data_dir: Diretório dos dados.
+    :param name: Nome da coleção, sem extensão (ex.: "tickets").
+    :return: Caminho de <name>.bson, se existir, ou de <name>.json.
+    """
+    file_path = os.path.join(data_dir, f"{name}.bson")
+    if os.path.exists(file_path):
+        return file_path
+    return os.path.join(data_dir, f"{name}.json")
+
+
+def load_bson_file(file_path):
+    """
+    Lê um arquivo .bson do mongodump, decodificando todos os documentos de uma vez.
+
+    :return: DataFrame com colunas tipadas (ver bson_to_frame).
+    """
+    with open(file_path, "rb") as f:
+        return bson_to_frame(bson.decode_all(f.read()))
+
+
 def load_json_data(data_dir):
     """
     Carrega arquivos JSON de um diretório e os converte em dicionários de DataFrames.
+
+    Quando existe um dump BSON (mongodump) com o mesmo nome, ele é usado no lugar do
+    Extended JSON (ver source_path) e já é entregue como DataFrame tipado.
     """
     data = {}
     try:
-        for file_name in os.listdir(data_dir):
-            if file_name.endswith(".json"):
-                file_path = os.path.join(data_dir, file_name)
+        names = {
+            name for name, extension in map(os.path.splitext, os.listdir(data_dir))
+            if extension in (".bson", ".json")
+        }
+        for name in sorted(names):
+            file_path = source_path(data_dir, name)
+            if file_path.endswith(".bson"):
+                data[name] = load_bson_file(file_path)
+            else:
                 with open(file_path, "r") as f:
-                    data[file_name.replace(".json", "")] = json.load(f)
+                    data[name] = json.load(f)
     except Exception as e:
         print(f"Erro ao carregar os dados: {e}")
-    return data
\ No newline at end of file
+    return data
@@ -0,0 +1,55 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def run_task_graph(tasks, max_workers=None, executor=None):
+    """
+    Executa um grafo de tarefas em um pool, iniciando cada tarefa assim que todas as
+    suas dependências terminam. Tarefas independentes rodam em paralelo.
+
+    :param tasks: Dicionário {nome: (função sem argumentos, lista de dependências)}.
+    :param max_workers: Número máximo de threads do pool criado (padrão do ThreadPoolExecutor).
+    :param executor: Executor já existente (ex.: ProcessPoolExecutor, para tarefas
+        serializáveis com pickle); quando informado, não é encerrado ao final.
+    :return: Tupla (resultados, erros), ambos dicionários na ordem de `tasks`. Tarefas
+        cujas dependências falharam não são executadas e recebem o erro da dependência.
+    """
+    for name, (_, dependencies) in tasks.items():
+        unknown = set(dependencies) - tasks.keys()
+        if unknown:
+            raise ValueError(f"Dependências desconhecidas para '{name}': {sorted(unknown)}")
+
+    results, errors = {}, {}
+    pending = dict(tasks)
+    running = {}
+
+    pool = executor or ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while pending or running:
+            for name in [n for n, (_, deps) in pending.items() if all(d in results or d in errors for d in deps)]:
+                function, dependencies = pending.pop(name)
+                failed = [d for d in dependencies if d in errors]
+                if failed:
+                    errors[name] = errors[failed[0]]
+                else:
+                    running[pool.submit(function)] = name
+
+            if not running:
+                if pending:
+                    raise ValueError(f"Ciclo de dependências entre as tarefas: {sorted(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    return (
+        {name: results[name] for name in tasks if name in results},
+        {name: errors[name] for name in tasks if name in errors},
+    )
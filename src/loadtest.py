@@ -0,0 +1,219 @@
+"""
+Teste de carga do dashboard: executa main.py com a API headless do Streamlit (AppTest)
+sobre conjuntos de dados gerados em tamanhos crescentes, simula interações (troca de
+competição, detalhamento do crescimento, agrupamento dos percentis) e mede a latência de
+cada rerun e o pico de memória de cada cenário.
+
+Uso:
+    python -m src.loadtest --scales 1,5,20 --budget-ms 1500
+
+Cada cenário roda em um processo separado (caches do Streamlit e pico de memória
+isolados). O comando termina com código 1 se algum cenário passar do orçamento de
+latência (P95 dos reruns) ou de memória, ou se o app exibir exceções ou mensagens de
+erro (as seções capturam os próprios erros e os exibem com st.error).
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Arquivo de origem -> campos com ids (do próprio registro ou de usuários) a replicar
+ID_FIELDS = {
+    "gamehistories": ["_id", "userId"],
+    "tickets": ["_id", "user"],
+    "users": ["_id"],
+    "orders": ["_id", "user"],
+    "notifications": ["_id", "userId"],
+}
+# Arquivos copiados sem alteração
+STATIC_FILES = ["gameevents.json", "competitions_gameroom.json", "distribution_data.json", "products.json"]
+
+
+def _replica_id(value, copy):
+    """
+    Id da cópia `copy` de um ObjectId (texto ou {"$oid"}); a cópia 0 mantém o id original.
+    """
+    if copy == 0:
+        return value
+    if isinstance(value, dict) and "$oid" in value:
+        return {"$oid": _replica_id(value["$oid"], copy)}
+    if isinstance(value, str) and len(value) == 24:
+        return f"{copy:04x}{value[4:]}"
+    return value
+
+
+def generate_dataset(source_dir, target_dir, scale):
+    """
+    Gera um conjunto de dados `scale` vezes maior que o de source_dir: cada usuário é
+    replicado com todas as suas partidas, tickets, orders e notificações, preservando as
+    distribuições por usuário e as datas.
+
+    :return: Número de partidas do conjunto gerado.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    for file_name in STATIC_FILES:
+        shutil.copy(os.path.join(source_dir, file_name), target_dir)
+
+    games = 0
+    for source, fields in ID_FIELDS.items():
+        with open(os.path.join(source_dir, f"{source}.json")) as f:
+            records = json.load(f)
+        replicated = [
+            {**record, **{field: _replica_id(record[field], copy) for field in fields if field in record}}
+            for copy in range(scale)
+            for record in records
+        ]
+        with open(os.path.join(target_dir, f"{source}.json"), "w") as f:
+            json.dump(replicated, f)
+        if source == "gamehistories":
+            games = len(replicated)
+    return games
+
+
+def _interactions(at):
+    """
+    Interações simuladas em cada rodada: (nome, função que altera o AppTest).
+    """
+    interactions = [("rerun", lambda app: app)]
+    for name in at.selectbox(key="competition_selectbox").options:
+        interactions.append((f"competição: {name}", lambda app, name=name: app.selectbox(key="competition_selectbox").select(name)))
+    for granularity in ["day", "hour", "month"]:
+        interactions.append((f"crescimento: {granularity}", lambda app, g=granularity: app.radio(key="growth_granularity").set_value(g)))
+    for grouping in ["Mês", "Evento"]:
+        interactions.append((f"percentis: {grouping}", lambda app, g=grouping: app.radio(key="sketch_grouping").set_value(g)))
+    return interactions
+
+
+def _peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(rounds, timeout):
+    """
+    Executa main.py no processo atual (usa MONACO_DATA_DIR/MONACO_STORE_DIR do ambiente).
+
+    :return: Dicionário com a carga inicial, as latências dos reruns (ms), o pico de
+        memória (MB) e as exceções e mensagens de erro exibidas pelo app.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT_DIR, "main.py"), default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    cold_ms = (time.perf_counter() - start) * 1000
+    exceptions = [e.value for e in at.exception]
+    errors = [e.value for e in at.error]
+
+    latencies = {}
+    for _ in range(rounds):
+        for name, interact in _interactions(at):
+            start = time.perf_counter()
+            interact(at).run()
+            latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+            exceptions.extend(e.value for e in at.exception)
+            errors.extend(e.value for e in at.error)
+
+    return {
+        "cold_ms": cold_ms,
+        "latencies": latencies,
+        "peak_memory_mb": _peak_memory_mb(),
+        "exceptions": sorted(set(exceptions)),
+        "errors": sorted(set(errors)),
+    }
+
+
+def _run_child(data_dir, store_dir, rounds, timeout):
+    env = {**os.environ, "MONACO_DATA_DIR": data_dir + os.sep, "MONACO_STORE_DIR": store_dir + os.sep}
+    output = subprocess.run(
+        [sys.executable, "-m", "src.loadtest", "--child", "--rounds", str(rounds), "--timeout", str(timeout)],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(scale, games, result):
+    """
+    Uma linha do relatório: percentis de latência de todos os reruns do cenário.
+    """
+    latencies = np.concatenate([values for values in result["latencies"].values()])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    slowest = max(result["latencies"], key=lambda name: np.median(result["latencies"][name]))
+    return {
+        "Escala": scale,
+        "Partidas": games,
+        "Carga Inicial (ms)": round(result["cold_ms"]),
+        "Reruns": len(latencies),
+        "P50 (ms)": round(p50),
+        "P95 (ms)": round(p95),
+        "P99 (ms)": round(p99),
+        "Máx (ms)": round(latencies.max()),
+        "Interação Mais Lenta": slowest,
+        "Pico de Memória (MB)": round(result["peak_memory_mb"]),
+        "Exceções": len(result["exceptions"]),
+        "Erros": len(result["errors"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga de reruns do Monaco Dashboard")
+    parser.add_argument("--data-dir", default=os.path.join(ROOT_DIR, "data"))
+    parser.add_argument("--scales", default="1,5,20", help="Fatores de multiplicação dos dados")
+    parser.add_argument("--rounds", type=int, default=3, help="Rodadas de interações por cenário")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Orçamento para o P95 dos reruns")
+    parser.add_argument("--memory-budget-mb", type=float, default=None, help="Orçamento para o pico de memória")
+    parser.add_argument("--timeout", type=float, default=600, help="Tempo máximo de cada execução do app (s)")
+    parser.add_argument("--output", default=None, help="CSV com o relatório")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.rounds, args.timeout)))
+        return
+
+    rows, failures = [], []
+    with tempfile.TemporaryDirectory(prefix="monaco-loadtest-") as work_dir:
+        for scale in [int(value) for value in args.scales.split(",")]:
+            data_dir = os.path.join(work_dir, f"data-x{scale}")
+            games = generate_dataset(args.data_dir, data_dir, scale)
+            print(f"Cenário x{scale}: {games} partidas...", flush=True)
+            result = _run_child(data_dir, os.path.join(work_dir, f"store-x{scale}"), args.rounds, args.timeout)
+            shutil.rmtree(data_dir)
+
+            row = summarize(scale, games, result)
+            rows.append(row)
+            if row["P95 (ms)"] > args.budget_ms:
+                failures.append(f"x{scale}: P95 de {row['P95 (ms)']} ms acima do orçamento de {args.budget_ms:.0f} ms")
+            if args.memory_budget_mb is not None and row["Pico de Memória (MB)"] > args.memory_budget_mb:
+                failures.append(
+                    f"x{scale}: pico de {row['Pico de Memória (MB)']} MB acima do orçamento de {args.memory_budget_mb:.0f} MB"
+                )
+            for exception in result["exceptions"]:
+                failures.append(f"x{scale}: exceção no app: {exception}")
+            for error in result["errors"]:
+                failures.append(f"x{scale}: erro exibido pelo app: {error}")
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    if args.output:
+        report.to_csv(args.output, index=False)
+
+    if failures:
+        print("\n".join(["", "FALHOU:", *failures]))
+        sys.exit(1)
+    print("\nOK: todos os cenários dentro do orçamento.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Colunas persistidas por tabela particionada por mês de createdAt
+STORE_COLUMNS = {
+    "tickets": ["_id", "user", "gameId", "amount", "createdAt"],
+    "game_histories": ["_id", "userId", "gameId", "coinsUsed", "createdAt"],
+    "orders": ["_id", "user", "totalAmount", "status", "paymentStatus", "paymentMethod", "createdAt"],
+    "notifications": ["_id", "userId", "notificationType", "message", "createdAt"],
+}
+
+MANIFEST_FILE = "_manifest.json"
+
+
+def unwrap_extended_json(value):
+    """
+    Remove os wrappers do Extended JSON ($oid, $numberInt, $numberDouble, $date...) de um
+    valor, inclusive dentro de listas e documentos aninhados (ex.: items das orders).
+    """
+    if isinstance(value, dict):
+        if "$date" in value:
+            date = unwrap_extended_json(value["$date"])
+            return pd.to_datetime(date) if isinstance(date, str) else pd.to_datetime(int(date), unit="ms")
+        for key in ("$oid", "$numberInt", "$numberLong", "$numberDouble"):
+            if key in value:
+                return value[key] if key == "$oid" else float(value[key])
+        return {key: unwrap_extended_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [unwrap_extended_json(item) for item in value]
+    return value
+
+
+def _epoch_ms(timestamp):
+    return int(pd.Timestamp(timestamp).value // 10**6)
+
+
+def normalize_columns(frame, columns):
+    """
+    Seleciona as colunas existentes e remove os wrappers do Extended JSON, deixando
+    colunas com tipos homogêneos (gravação em Parquet/Arrow).
+
+    :param frame: DataFrame gerado por process_json_data.
+    :param columns: Colunas a manter.
+    :return: Novo DataFrame; frame não é alterado.
+    """
+    columns = [column for column in columns if column in frame.columns]
+    normalized = frame[columns].copy()
+    for column in columns:
+        if column != "createdAt" and normalized[column].dtype == object:
+            normalized[column] = normalized[column].map(unwrap_extended_json)
+    if "totalAmount" in normalized.columns:
+        normalized["totalAmount"] = pd.to_numeric(normalized["totalAmount"], errors="coerce").fillna(0.0)
+    return normalized.infer_objects()
+
+
+def _to_store_frame(table, frame):
+    return normalize_columns(frame, STORE_COLUMNS[table])
+
+
+class PartitionedStore:
+    """
+    Armazenamento local em Parquet particionado por mês, com estatísticas de
+    createdAt mínimo/máximo por partição para leitura apenas das partições necessárias.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        # Tabelas cuja última gravação falhou: as partições podem estar ausentes ou sem os
+        # meses mais recentes, então as leituras devem usar os dados em memória
+        self.stale = set()
+
+    def _table_dir(self, table):
+        return os.path.join(self.store_dir, table)
+
+    def _read_manifest(self, table):
+        try:
+            with open(os.path.join(self._table_dir(table), MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"source": None, "partitions": {}}
+        # Manifestos antigos guardavam só as partições, sem a versão da origem
+        if "partitions" not in manifest:
+            return {"source": None, "partitions": manifest}
+        return manifest
+
+    def manifest(self, table):
+        """
+        Retorna as partições da tabela: {mês: {"file", "rows", "min_createdAt", "max_createdAt"}}.
+        """
+        return self._read_manifest(table)["partitions"]
+
+    def source_version(self, table):
+        """
+        Retorna a versão (digest) do arquivo de origem gravada com as partições, ou None.
+        """
+        return self._read_manifest(table)["source"]
+
+    def write(self, table, frame, months=None, source=None):
+        """
+        Grava as partições mensais da tabela.
+
+        Cada gravação usa nomes de arquivo novos e só depois troca o manifesto (de forma
+        atômica) e remove os arquivos que ele não referencia mais: um leitor em outro
+        processo que carregou o manifesto anterior continua encontrando as partições.
+
+        :param table: Nome da tabela (chave de STORE_COLUMNS).
+        :param frame: DataFrame completo e normalizado da tabela.
+        :param months: Meses ("YYYY-MM") a regravar; None regrava a tabela inteira.
+        :param source: Versão (digest) do arquivo de origem dos dados gravados.
+        """
+        table_dir = self._table_dir(table)
+        os.makedirs(table_dir, exist_ok=True)
+        previous = self.manifest(table)
+        manifest = {} if months is None else dict(previous)
+
+        store_frame = _to_store_frame(table, frame)
+        month_keys = store_frame["createdAt"].dt.strftime("%Y-%m")
+        if months is not None:
+            store_frame = store_frame[month_keys.isin(months)]
+            month_keys = month_keys[store_frame.index]
+
+        version = uuid.uuid4().hex[:12]
+        for month, partition in store_frame.groupby(month_keys):
+            file_name = f"{month}-{version}.parquet"
+            pq.write_table(
+                pa.Table.from_pandas(partition, preserve_index=False),
+                os.path.join(table_dir, file_name),
+            )
+            manifest[month] = {
+                "file": file_name,
+                "rows": len(partition),
+                "min_createdAt": _epoch_ms(partition["createdAt"].min()),
+                "max_createdAt": _epoch_ms(partition["createdAt"].max()),
+            }
+
+        temp_path = os.path.join(table_dir, f"{MANIFEST_FILE}.{version}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"source": source, "partitions": manifest}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, os.path.join(table_dir, MANIFEST_FILE))
+
+        # Remove apenas os arquivos do manifesto anterior (nunca os de uma gravação em
+        # andamento em outro processo)
+        current = {stats["file"] for stats in manifest.values()}
+        for stats in previous.values():
+            if stats["file"] not in current:
+                try:
+                    os.remove(os.path.join(table_dir, stats["file"]))
+                except FileNotFoundError:
+                    pass
+
+    def partitions_for_window(self, table, start_date, end_date):
+        """
+        Lista os arquivos das partições cujo intervalo [min, max] de createdAt cruza a janela.
+        """
+        start_ms, end_ms = _epoch_ms(start_date), _epoch_ms(end_date)
+        return [
+            os.path.join(self._table_dir(table), stats["file"])
+            for _, stats in sorted(self.manifest(table).items())
+            if stats["max_createdAt"] >= start_ms and stats["min_createdAt"] <= end_ms
+        ]
+
+    def read_window(self, table, start_date, end_date, columns=None):
+        """
+        Lê apenas as linhas com createdAt em [start_date, end_date], abrindo somente as
+        partições que se sobrepõem à janela.
+
+        :param table: Nome da tabela.
+        :param start_date: Início da janela (inclusivo).
+        :param end_date: Fim da janela (inclusivo).
+        :param columns: Colunas a carregar (padrão: todas).
+        :return: DataFrame com as linhas da janela.
+        """
+        if columns is not None and "createdAt" not in columns:
+            columns = [*columns, "createdAt"]
+        files = self.partitions_for_window(table, start_date, end_date)
+        if not files:
+            return pd.DataFrame({
+                column: pd.Series(dtype="datetime64[ns]" if column == "createdAt" else object)
+                for column in columns or STORE_COLUMNS[table]
+            })
+
+        try:
+            frame = pd.concat([pq.read_table(path, columns=columns).to_pandas() for path in files], ignore_index=True)
+        except FileNotFoundError:
+            # Outro processo regravou a tabela entre a leitura do manifesto e a das
+            # partições: o manifesto novo já referencia os arquivos atuais
+            files = self.partitions_for_window(table, start_date, end_date)
+            frame = pd.concat([pq.read_table(path, columns=columns).to_pandas() for path in files], ignore_index=True)
+        return frame[
+            (frame["createdAt"] >= pd.to_datetime(start_date)) & (frame["createdAt"] <= pd.to_datetime(end_date))
+        ].reset_index(drop=True)
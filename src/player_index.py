@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from src.partitions import unwrap_extended_json
+from src.sessions import user_time_order
+
+# Tabela de fatos -> (coluna com o id do usuário, colunas exibidas no histórico)
+HISTORY_TABLES = {
+    "game_histories": ("userId", ["createdAt", "gameId", "coinsUsed"]),
+    "tickets": ("user", ["createdAt", "gameId", "amount"]),
+    "orders": ("user", ["createdAt", "totalAmount", "status", "paymentStatus", "paymentMethod"]),
+    "notifications": ("userId", ["createdAt", "message"]),
+}
+
+# Campos de usuário pesquisáveis por prefixo (espelham os índices nickname_1 e email_1 do Mongo)
+SEARCH_FIELDS = ["nickname", "email"]
+
+# Maior caractere Unicode: prefixo + SENTINEL limita o fim do intervalo de um prefixo
+SENTINEL = "\U0010ffff"
+
+
+def _text_keys(values):
+    return np.array([str(value).casefold() if isinstance(value, str) else "" for value in values], dtype=object)
+
+
+def _user_column(values):
+    # Remove {"$oid"} apenas quando a coluna ainda está em Extended JSON (ex.: orders.user)
+    values = pd.Series(values)
+    present = values.dropna()
+    if len(present) and isinstance(present.iloc[0], dict):
+        values = values.map(unwrap_extended_json)
+    return values.to_numpy(dtype=object)
+
+
+class PlayerIndex:
+    """
+    Índice por usuário para o detalhamento de jogadores.
+
+    As tabelas de fatos são ordenadas por (usuário, createdAt) uma única vez e guardadas
+    em layout CSR: o histórico de um usuário é a fatia offsets[i]:offsets[i + 1], obtida
+    com uma busca binária pelo id (O(log n)), sem varrer as tabelas. Nickname e email
+    ficam em vetores ordenados para busca por prefixo (autocompletar) também por busca
+    binária.
+    """
+
+    def __init__(self, tables):
+        users = tables["users"]
+        user_ids = _user_column(users["_id"])
+        user_columns = {
+            table: _user_column(tables[table][column])
+            for table, (column, _) in HISTORY_TABLES.items() if table in tables
+        }
+
+        # Ids de todos os usuários (inclusive os que só aparecem nas tabelas de fatos), ordenados;
+        # o código de cada linha é a posição do seu id em user_ids (-1 para linhas sem usuário)
+        codes, unique_ids = pd.factorize(np.concatenate([user_ids, *user_columns.values()]))
+        unique_ids = np.asarray(unique_ids, dtype=object)
+        id_order = np.argsort(unique_ids)
+        ranks = np.empty(len(unique_ids), dtype=np.int64)
+        ranks[id_order] = np.arange(len(unique_ids))
+        codes = np.where(codes >= 0, ranks[codes], -1)
+        self.user_ids = unique_ids[id_order]
+
+        self.histories, self.offsets = {}, {}
+        start = len(user_ids)
+        for table, users_of_rows in user_columns.items():
+            frame = tables[table]
+            table_codes = codes[start:start + len(users_of_rows)]
+            start += len(users_of_rows)
+            times = frame["createdAt"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+            order = user_time_order(table_codes, times)
+            self.histories[table] = frame.iloc[order][HISTORY_TABLES[table][1]].reset_index(drop=True)
+            self.offsets[table] = np.searchsorted(table_codes[order], np.arange(len(self.user_ids) + 1))
+
+        self.users = pd.DataFrame({
+            "userId": user_ids,
+            "nickname": users["nickname"].to_numpy(dtype=object) if "nickname" in users else None,
+            "email": users["email"].to_numpy(dtype=object) if "email" in users else None,
+            "name": users["name"].to_numpy(dtype=object) if "name" in users else None,
+        })
+
+        # Índices de prefixo: chave em minúsculas ordenada -> linha de self.users
+        self._prefix_keys, self._prefix_rows = {}, {}
+        for field in SEARCH_FIELDS:
+            keys = _text_keys(self.users[field])
+            order = np.argsort(keys, kind="stable")
+            self._prefix_keys[field] = keys[order]
+            self._prefix_rows[field] = order
+
+    def _position(self, user_id):
+        position = np.searchsorted(self.user_ids, user_id)
+        if position < len(self.user_ids) and self.user_ids[position] == user_id:
+            return position
+        return None
+
+    def history(self, user_id, table):
+        """
+        Histórico de um usuário em uma tabela de fatos, em ordem cronológica.
+
+        :param user_id: Id do usuário.
+        :param table: Chave de HISTORY_TABLES.
+        :return: DataFrame (vazio se o usuário não tiver registros).
+        """
+        position = self._position(user_id)
+        if position is None:
+            return self.histories[table].iloc[:0]
+        offsets = self.offsets[table]
+        return self.histories[table].iloc[offsets[position]:offsets[position + 1]]
+
+    def counts(self, user_id):
+        """
+        Número de registros do usuário em cada tabela de fatos (diferença dos offsets).
+        """
+        position = self._position(user_id)
+        return {
+            table: 0 if position is None else int(offsets[position + 1] - offsets[position])
+            for table, offsets in self.offsets.items()
+        }
+
+    def search(self, prefix, limit=10):
+        """
+        Usuários cujo nickname ou email começa com `prefix` (sem diferenciar maiúsculas).
+
+        :param prefix: Texto digitado.
+        :param limit: Número máximo de resultados.
+        :return: DataFrame com userId, nickname, email e name, nickname antes de email.
+        """
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return self.users.iloc[:0]
+
+        rows = []
+        for field in SEARCH_FIELDS:
+            keys = self._prefix_keys[field]
+            start = np.searchsorted(keys, prefix, side="left")
+            end = min(np.searchsorted(keys, prefix + SENTINEL, side="left"), start + limit)
+            rows.extend(self._prefix_rows[field][start:end])
+        return self.users.iloc[list(dict.fromkeys(rows))[:limit]].reset_index(drop=True)
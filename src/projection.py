@@ -0,0 +1,204 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+GAME_IDS = {
+    "The Runner": "1",
+    "Day One": "2",
+    "Lava Rush": "3",
+    "Super Monaco": "4",
+}
+GAME_NAMES = list(GAME_IDS.keys())
+SEGMENTS = ["Heavy Users", "Casuais"]
+
+# Todos os 15 subconjuntos não vazios de jogos, representados como máscaras de bits
+GAME_SUBSETS = [
+    combo
+    for size in range(1, len(GAME_NAMES) + 1)
+    for combo in itertools.combinations(GAME_NAMES, size)
+]
+
+
+def _subset_mask(games):
+    return sum(1 << GAME_NAMES.index(game) for game in games)
+
+
+def _user_masks(user_ids, game_bits):
+    """
+    Combina (OR) os bits dos jogos de cada usuário em uma única máscara.
+    """
+    frame = pd.DataFrame({"user": user_ids, "bit": game_bits})
+    frame = frame.drop_duplicates()
+    return frame.groupby("user")["bit"].sum()
+
+
+def build_projection_stats(game_histories, tickets, heavy_user_quantile=0.8):
+    """
+    Pré-calcula as estatísticas suficientes para as projeções, uma única vez.
+
+    Para cada segmento (heavy users e casuais) são guardados o total de partidas e de
+    tickets por jogo e um histograma de usuários por máscara de jogos jogados, o que
+    permite obter o número exato de usuários distintos de qualquer subconjunto de jogos.
+
+    :param game_histories: DataFrame com histórico de partidas.
+    :param tickets: DataFrame de tickets.
+    :param heavy_user_quantile: Quantil de partidas por usuário a partir do qual o usuário é heavy user.
+    :return: Dicionário com os arrays de estatísticas por segmento e jogo.
+    """
+    game_bit = {game_id: 1 << i for i, game_id in enumerate(GAME_IDS.values())}
+    game_index = {game_id: i for i, game_id in enumerate(GAME_IDS.values())}
+
+    games = game_histories[game_histories["gameId"].isin(game_bit)]
+    ticket_rows = tickets[tickets["gameId"].isin(game_bit)]
+
+    # Segmentação: heavy users são os que estão acima do quantil de partidas
+    games_per_user = games["userId"].value_counts()
+    threshold = games_per_user.quantile(heavy_user_quantile) if not games_per_user.empty else 0
+    heavy_users = games_per_user.index[games_per_user > threshold]
+
+    n_segments, n_games = len(SEGMENTS), len(GAME_NAMES)
+    game_counts = np.zeros((n_segments, n_games))
+    ticket_counts = np.zeros((n_segments, n_games))
+    ticket_sums = np.zeros((n_segments, n_games))
+    game_user_masks = np.zeros((n_segments, 1 << n_games))
+    ticket_user_masks = np.zeros((n_segments, 1 << n_games))
+
+    game_segment = np.where(games["userId"].isin(heavy_users), 0, 1)
+    ticket_segment = np.where(ticket_rows["user"].isin(heavy_users), 0, 1)
+
+    np.add.at(game_counts, (game_segment, games["gameId"].map(game_index).to_numpy()), 1)
+    np.add.at(ticket_counts, (ticket_segment, ticket_rows["gameId"].map(game_index).to_numpy()), 1)
+    np.add.at(
+        ticket_sums,
+        (ticket_segment, ticket_rows["gameId"].map(game_index).to_numpy()),
+        ticket_rows["amount"].to_numpy(dtype=float),
+    )
+
+    game_masks = _user_masks(games["userId"], games["gameId"].map(game_bit))
+    ticket_masks = _user_masks(ticket_rows["user"], ticket_rows["gameId"].map(game_bit))
+    np.add.at(
+        game_user_masks,
+        (np.where(game_masks.index.isin(heavy_users), 0, 1), game_masks.to_numpy()),
+        1,
+    )
+    np.add.at(
+        ticket_user_masks,
+        (np.where(ticket_masks.index.isin(heavy_users), 0, 1), ticket_masks.to_numpy()),
+        1,
+    )
+
+    return {
+        "game_counts": game_counts,
+        "ticket_counts": ticket_counts,
+        "ticket_sums": ticket_sums,
+        "game_user_masks": game_user_masks,
+        "ticket_user_masks": ticket_user_masks,
+        "heavy_user_threshold": threshold,
+    }
+
+
+def _subset_totals(stats, subset_masks):
+    """
+    Agrega as estatísticas por segmento para cada subconjunto de jogos.
+
+    :return: Tupla (partidas, linhas de tickets, tickets, usuários de partidas, usuários
+        de tickets), cada uma com shape (segmentos, subconjuntos).
+    """
+    game_bits = 1 << np.arange(len(GAME_NAMES))
+    # subset_games[s, g] indica se o jogo g pertence ao subconjunto s
+    subset_games = (subset_masks[:, None] & game_bits[None, :]) > 0
+    # overlap[s, m] indica se um usuário com máscara m jogou algum jogo do subconjunto s
+    overlap = (subset_masks[:, None] & np.arange(1 << len(GAME_NAMES))[None, :]) > 0
+
+    return (
+        stats["game_counts"] @ subset_games.T,
+        stats["ticket_counts"] @ subset_games.T,
+        stats["ticket_sums"] @ subset_games.T,
+        stats["game_user_masks"] @ overlap.T,
+        stats["ticket_user_masks"] @ overlap.T,
+    )
+
+
+def evaluate_projection_grid(stats, num_clients, base_percentages, weeks, game_subsets=None):
+    """
+    Avalia, em uma única passagem vetorizada, a grade completa de cenários de projeção:
+    clientes × percentual de adesão × semanas × subconjuntos de jogos.
+
+    :param stats: Estatísticas geradas por build_projection_stats.
+    :param num_clients: Lista de quantidades de clientes.
+    :param base_percentages: Lista de percentuais de clientes que jogarão.
+    :param weeks: Lista de durações em semanas.
+    :param game_subsets: Subconjuntos de jogos a avaliar (padrão: os 15 subconjuntos não vazios).
+    :return: DataFrame com uma linha por cenário, incluindo a quebra por segmento.
+    """
+    game_subsets = GAME_SUBSETS if game_subsets is None else [tuple(s) for s in game_subsets]
+    subset_masks = np.array([_subset_mask(subset) for subset in game_subsets])
+    games, ticket_rows, ticket_values, game_users, ticket_users = _subset_totals(stats, subset_masks)
+
+    total_games = games.sum(axis=0)
+    total_ticket_rows = ticket_rows.sum(axis=0)
+    total_ticket_values = ticket_values.sum(axis=0)
+    total_game_users = game_users.sum(axis=0)
+    total_ticket_users = ticket_users.sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_games_per_user = np.where(total_game_users > 0, total_games / total_game_users, 0)
+        avg_ticket_value_per_user = np.where(total_ticket_users > 0, total_ticket_values / total_ticket_users, 0)
+        # Contribuição de cada segmento para a média geral: (usuários do segmento / total) × média do segmento
+        segment_games = np.where(total_game_users > 0, games / total_game_users, 0)
+        segment_tickets = np.where(total_ticket_users > 0, ticket_values / total_ticket_users, 0)
+
+    # Cenários sem linhas de partidas ou de tickets são zerados (tickets que somam 0 não zeram)
+    empty = (total_games == 0) | (total_ticket_rows == 0)
+    avg_games_per_user[empty] = 0
+    avg_ticket_value_per_user[empty] = 0
+    segment_games[:, empty] = 0
+    segment_tickets[:, empty] = 0
+
+    clients, percentages, durations = np.meshgrid(
+        np.asarray(num_clients, dtype=float),
+        np.asarray(base_percentages, dtype=float),
+        np.asarray(weeks, dtype=float),
+        indexing="ij",
+    )
+    # scale[c, p, w] = clientes ajustados × semanas
+    scale = (clients * percentages / 100 * durations).reshape(-1, 1)
+    n_scenarios, n_subsets = scale.shape[0], len(game_subsets)
+
+    result = pd.DataFrame({
+        "Clientes": np.repeat(clients.ravel(), n_subsets).astype(int),
+        "Percentual (%)": np.repeat(percentages.ravel(), n_subsets),
+        "Semanas": np.repeat(durations.ravel(), n_subsets).astype(int),
+        "Jogos": np.tile([", ".join(subset) for subset in game_subsets], n_scenarios),
+        "Partidas Estimadas": (scale * avg_games_per_user).ravel(),
+        "Tickets Estimados": (scale * avg_ticket_value_per_user).ravel(),
+        "Média de Partidas por Usuário": np.tile(avg_games_per_user, n_scenarios),
+        "Média de Tickets por Usuário": np.tile(avg_ticket_value_per_user, n_scenarios),
+    })
+    for i, segment in enumerate(SEGMENTS):
+        result[f"Partidas - {segment}"] = (scale * segment_games[i]).ravel()
+        result[f"Tickets - {segment}"] = (scale * segment_tickets[i]).ravel()
+
+    return result
+
+
+def game_percentages(stats, selected_games):
+    """
+    Calcula o percentual de partidas e de tickets de cada jogo dentro do subconjunto selecionado.
+
+    :return: Dicionário {jogo: (percentual de partidas, percentual de tickets)}.
+    """
+    games = stats["game_counts"].sum(axis=0)
+    ticket_values = stats["ticket_sums"].sum(axis=0)
+    indexes = [GAME_NAMES.index(game) for game in selected_games]
+    total_games = games[indexes].sum()
+    total_ticket_values = ticket_values[indexes].sum()
+
+    return {
+        GAME_NAMES[i]: (
+            (games[i] / total_games) * 100 if total_games > 0 else 0,
+            (ticket_values[i] / total_ticket_values) * 100 if total_ticket_values > 0 else 0,
+        )
+        for i in indexes
+    }
@@ -0,0 +1,539 @@
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import bson
+import pandas as pd
+
+from src.analysis import (
+    _event_dates,
+    analyze_growth,
+    calculate_event_summary_with_outside_events,
+    calculate_game_distribution,
+    calculate_orders_by_event,
+    calculate_tickets_by_game_and_month,
+    calculate_top_heavy_users,
+    calculate_top_users_event_summary,
+    calculate_unique_order_values_by_event,
+    process_json_data,
+)
+from src.anomalies import TicketAnomalyDetector
+from src.coins import build_coin_ledger, coin_metrics, coin_purchases
+from src.data_loader import bson_to_frame, source_path
+from src.executor import run_task_graph
+from src.partitions import STORE_COLUMNS, PartitionedStore, normalize_columns, unwrap_extended_json
+from src.player_index import PlayerIndex
+from src.projection import build_projection_stats
+from src.sessions import sessionize
+from src.shared_dataset import SHARED_COLUMNS, SharedDataset
+from src.sketches import build_sketch_cells, merge_sketch_cells
+
+# Tabela normalizada -> (arquivo de origem em data/, tipo usado em process_json_data)
+TABLES = {
+    "game_histories": ("gamehistories", "game_histories"),
+    "tickets": ("tickets", "tickets"),
+    "users": ("users", "users"),
+    "game_events": ("gameevents", "game_events"),
+    "orders": ("orders", "orders"),
+    "notifications": ("notifications", "notifications"),
+    "products": ("products", "products"),
+}
+
+
+def _add_series(previous, delta, sort=True):
+    merged = previous.add(delta, fill_value=0).astype(previous.dtype)
+    if sort:
+        return merged.sort_index()
+    # Mantém a ordem original das categorias e acrescenta as novas no final
+    return merged.reindex(previous.index.append(delta.index.difference(previous.index)))
+
+
+def _window(tables, store, table, start_date, end_date):
+    """
+    Linhas da tabela dentro da janela, lidas do armazenamento particionado quando
+    disponível e atualizado (tabelas com gravação pendente são lidas da memória).
+    """
+    if store is not None and table not in store.stale:
+        return store.read_window(table, start_date, end_date)
+    frame = tables[table]
+    return frame[(frame["createdAt"] >= pd.to_datetime(start_date)) & (frame["createdAt"] <= pd.to_datetime(end_date))]
+
+
+def _event_window(tables, store, table):
+    """
+    Linhas da tabela entre o início do primeiro e o fim do último evento: as únicas
+    lidas pelos resumos por evento (eventos e intervalos entre eventos).
+    """
+    start_dates, end_dates = _event_dates(tables["game_events"])
+    return _window(tables, store, table, start_dates.min(), end_dates.max())
+
+
+def _merge_growth(previous, deltas, tables):
+    delta = analyze_growth(deltas["game_histories"], deltas["tickets"], deltas["users"])
+    return tuple(_add_series(old, new) for old, new in zip(previous, delta))
+
+
+def _merge_game_distribution(previous, deltas, tables):
+    return _add_series(previous, calculate_game_distribution(deltas["tickets"]), sort=False)
+
+
+def _merge_tickets_by_game_and_month(previous, deltas, tables):
+    delta = calculate_tickets_by_game_and_month(deltas["tickets"])
+    columns = previous.columns.append(delta.columns.difference(previous.columns))
+    merged = previous.add(delta, fill_value=0).fillna(0).astype(previous.dtypes.iloc[0])
+    return merged[columns].sort_index()
+
+
+def _ticket_sketches(tickets, game_events):
+    return build_sketch_cells(tickets, "user", "amount", game_column="gameId", game_events=game_events)
+
+
+def _order_sketches(orders, game_events):
+    paid = orders[orders["paymentStatus"] == "paid"]
+    paid = pd.DataFrame({
+        "createdAt": paid["createdAt"],
+        "user": paid["user"].map(unwrap_extended_json),
+        "totalAmount": paid["totalAmount"].map(unwrap_extended_json),
+    })
+    return build_sketch_cells(paid, "user", "totalAmount", game_events=game_events)
+
+
+def _compute_ticket_sketches(tables, store):
+    return _ticket_sketches(tables["tickets"], tables["game_events"])
+
+
+def _compute_order_sketches(tables, store):
+    return _order_sketches(tables["orders"], tables["game_events"])
+
+
+def _process_context():
+    # forkserver: os processos não herdam as threads do servidor (Streamlit, tornado) e
+    # partem de um servidor que já importou este módulo
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return None
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def _merge_ticket_anomalies(previous, deltas, tables):
+    # O detector anterior pode estar sendo lido por outra sessão: continua em uma cópia
+    if previous.is_late(deltas["tickets"]):
+        return TicketAnomalyDetector().process(tables["tickets"])
+    return copy.deepcopy(previous).process(deltas["tickets"])
+
+
+# Seções do dashboard: tabelas de entrada, função de cálculo (recebe as tabelas e o
+# armazenamento particionado, que pode ser None) e, quando o agregado é aditivo,
+# função que incorpora apenas as linhas novas (crescimento append-only); ela recebe o
+# resultado anterior, os deltas (vazios para tabelas inalteradas) e as tabelas completas.
+# Seções com "process" rodam no pool de processos: a função de cálculo precisa ser
+# uma função de módulo (serializável com pickle).
+SECTIONS = {
+    "growth": {
+        "tables": ["game_histories", "tickets", "users"],
+        "compute": lambda t, store: analyze_growth(t["game_histories"], t["tickets"], t["users"]),
+        "merge": _merge_growth,
+    },
+    "game_distribution": {
+        "tables": ["tickets"],
+        "compute": lambda t, store: calculate_game_distribution(t["tickets"]),
+        "merge": _merge_game_distribution,
+    },
+    "tickets_by_game_and_month": {
+        "tables": ["tickets"],
+        "compute": lambda t, store: calculate_tickets_by_game_and_month(t["tickets"]),
+        "merge": _merge_tickets_by_game_and_month,
+    },
+    "event_summary": {
+        "tables": ["game_histories", "tickets", "game_events"],
+        "compute": lambda t, store: calculate_event_summary_with_outside_events(
+            _event_window(t, store, "game_histories"), _event_window(t, store, "tickets"), t["game_events"]
+        ),
+    },
+    "orders_summary": {
+        "tables": ["orders", "game_events"],
+        "compute": lambda t, store: calculate_orders_by_event(_event_window(t, store, "orders"), t["game_events"]),
+    },
+    "unique_order_values": {
+        "tables": ["orders", "game_events"],
+        "compute": lambda t, store: calculate_unique_order_values_by_event(
+            _event_window(t, store, "orders"), t["game_events"]
+        ),
+    },
+    "top_heavy_users": {
+        "tables": ["game_histories", "users"],
+        "compute": lambda t, store: calculate_top_heavy_users(t["game_histories"], t["users"]),
+    },
+    "top_users_natal": {
+        "tables": ["game_histories", "users"],
+        "compute": lambda t, store: calculate_top_users_event_summary(
+            _window(t, store, "game_histories", "2024-12-13", "2024-12-24"),
+            t["users"], "Campeonato Season 6 - Natal", "2024-12-13", "2024-12-24", top_n=10,
+        ),
+    },
+    "ticket_sketches": {
+        "tables": ["tickets", "game_events"],
+        "compute": _compute_ticket_sketches,
+        "process": True,
+        "merge": lambda previous, d, t: merge_sketch_cells(
+            previous, _ticket_sketches(d["tickets"], t["game_events"]), t["game_events"]
+        ),
+    },
+    "order_sketches": {
+        "tables": ["orders", "game_events"],
+        "compute": _compute_order_sketches,
+        "process": True,
+        "merge": lambda previous, d, t: merge_sketch_cells(
+            previous, _order_sketches(d["orders"], t["game_events"]), t["game_events"]
+        ),
+    },
+    "ticket_anomalies": {
+        "tables": ["tickets"],
+        "compute": lambda t, store: TicketAnomalyDetector().process(t["tickets"]),
+        "merge": _merge_ticket_anomalies,
+    },
+    "coin_economy": {
+        "tables": ["game_histories", "notifications", "users", "orders", "products"],
+        "compute": lambda t, store: coin_metrics(build_coin_ledger(
+            t["game_histories"], t["notifications"], t["users"], coin_purchases(t["orders"], t["products"])
+        )),
+    },
+    "player_index": {
+        "tables": ["users", "game_histories", "tickets", "orders", "notifications"],
+        "compute": lambda t, store: PlayerIndex(t),
+    },
+    "sessions": {
+        "tables": ["game_histories", "tickets"],
+        "compute": lambda t, store: sessionize(t["game_histories"], t["tickets"]),
+    },
+    "projection_stats": {
+        "tables": ["game_histories", "tickets"],
+        "compute": lambda t, store: build_projection_stats(t["game_histories"], t["tickets"]),
+    },
+}
+
+
+def _record_key(records, position):
+    """
+    Identificador de um registro bruto (lista do JSON ou DataFrame de um dump BSON), usado
+    para detectar crescimento append-only.
+    """
+    if isinstance(records, pd.DataFrame):
+        value = records["_id"].iloc[position] if "_id" in records.columns else None
+    else:
+        value = records[position].get("_id")
+    return json.dumps(unwrap_extended_json(value), sort_keys=True, default=str)
+
+
+def load_source(raw, is_bson, data_type, previous=None, columns=None):
+    """
+    Decodifica e normaliza o conteúdo de um arquivo de origem. É uma função de módulo
+    (serializável com pickle) para poder rodar em um processo do pool, fora do GIL do
+    processo principal.
+
+    :param raw: Conteúdo do arquivo (bytes).
+    :param is_bson: True para dumps BSON (mongodump), False para Extended JSON.
+    :param data_type: Tipo usado em process_json_data.
+    :param previous: Estado da leitura anterior ({"count", "first", "last"}), usado para
+        detectar crescimento append-only.
+    :param columns: Colunas a normalizar para o conjunto compartilhado (opcional).
+    :return: Tupla (modo, DataFrame, estado): modo "append" (DataFrame só com os registros
+        novos) ou "full".
+    """
+    records = bson_to_frame(bson.decode_all(raw)) if is_bson else json.loads(raw)
+    state = {
+        "count": len(records),
+        "first": _record_key(records, 0) if len(records) else None,
+        "last": _record_key(records, -1) if len(records) else None,
+    }
+
+    count = previous["count"] if previous else 0
+    appended = (
+        previous is not None
+        and 0 < count < len(records)
+        and _record_key(records, 0) == previous["first"]
+        and _record_key(records, count - 1) == previous["last"]
+    )
+    frame = process_json_data(records[count:] if appended else records, data_type)
+    if columns is not None:
+        frame = normalize_columns(frame, columns)
+    return ("append" if appended else "full"), frame, state
+
+
+class Snapshot:
+    """
+    Resultados publicados ao final de uma atualização: versão, resultados e erros das
+    seções. Não muda depois de publicado, então quem guarda o snapshot lê versão e
+    resultados consistentes mesmo enquanto a próxima atualização está em andamento.
+    """
+
+    def __init__(self, version=0, results=None, errors=None):
+        self.version = version
+        self.results = results or {}
+        self.errors = errors or {}
+
+    def get(self, name):
+        """
+        Retorna o resultado de uma seção, repassando o erro do último cálculo, se houver.
+        """
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+
+class RefreshEngine:
+    """
+    Mantém as tabelas normalizadas e os resultados das seções do dashboard, recalculando
+    apenas o que depende dos arquivos de data/ que mudaram desde a última atualização.
+
+    Com shared_dir, as tabelas são publicadas como arquivos Arrow mapeados em memória:
+    outros processos (workers do Streamlit, a API) que encontram a mesma versão dos dados
+    abrem esses arquivos em vez de reler e normalizar o JSON, e todos compartilham as
+    mesmas páginas de memória. Nesse modo as tabelas são somente leitura.
+
+    O grafo de tarefas roda em threads. Com processes > 0, a decodificação do JSON/BSON e
+    as seções pesadas (marcadas com "process") vão para um pool de processos, já que esse
+    trabalho segura o GIL e não escala em threads.
+    """
+
+    def __init__(self, data_dir, sections=None, store_dir=None, max_workers=None, shared_dir=None, processes=0):
+        self.data_dir = data_dir
+        self.max_workers = max_workers
+        # Processos para o trabalho de CPU (decodificação das tabelas e seções marcadas com
+        # "process"). Iniciar o pool custa cerca de 1 s (importação do projeto nos processos):
+        # só compensa com volumes grandes e várias CPUs, por isso é opcional (0 = desligado)
+        self.processes = processes
+        self._pool = None
+        self.sections = SECTIONS if sections is None else sections
+        self.store = PartitionedStore(store_dir) if store_dir else None
+        self.shared = SharedDataset(shared_dir) if shared_dir else None
+        self.tables = {}
+        self._snapshot = Snapshot()
+        self._sources = {}  # origem -> {"stat", "digest", "count", "first", "last"}
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+
+    @property
+    def data_version(self):
+        """
+        Versão dos resultados publicados: contador incrementado ao final de cada
+        atualização em que algum arquivo de origem mudou.
+        """
+        return self._snapshot.version
+
+    @property
+    def results(self):
+        return self._snapshot.results
+
+    @property
+    def errors(self):
+        return self._snapshot.errors
+
+    def snapshot(self):
+        """
+        Versão e resultados publicados, como um único objeto consistente (ver Snapshot).
+        """
+        return self._snapshot
+
+    def _run(self, function, *args):
+        """
+        Executa uma função de módulo no pool de processos (quando habilitado); a thread
+        que chama apenas espera o resultado.
+        """
+        if not self.processes:
+            return function(*args)
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=_process_context())
+        return self._pool.submit(function, *args).result()
+
+    def close(self):
+        """
+        Encerra o pool de processos, se houver.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _read_source(self, source, table):
+        """
+        Lê um arquivo de origem se ele mudou desde a última leitura.
+
+        :param source: Nome do arquivo de origem em data/.
+        :param table: Tabela correspondente (tipo dos dados e versão já publicada no
+            conjunto compartilhado).
+        :return: Tupla (modo, DataFrame), onde modo é None (sem mudança), "append" (apenas
+            registros novos no final; o DataFrame contém só o delta), "full" ou "shared"
+            (DataFrame mapeado do conjunto compartilhado). Exceto no modo "shared", o
+            DataFrame já passou por process_json_data.
+        """
+        file_path = source_path(self.data_dir, source)
+        stat = os.stat(file_path)
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        previous = self._sources.get(source)
+        if previous and previous["stat"] == fingerprint:
+            return None, None
+
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+
+        if previous and previous["digest"] == digest:
+            self._sources[source] = {**previous, "stat": fingerprint}
+            return None, None
+
+        shared = self.shared is not None and table in SHARED_COLUMNS
+        # Primeira leitura neste processo de uma versão já publicada por outro processo
+        if previous is None and shared and self.shared.has(table, digest):
+            frame, metadata = self.shared.open(table, digest)
+            self._sources[source] = {"stat": fingerprint, "digest": digest, **metadata}
+            return "shared", frame
+
+        mode, frame, state = self._run(
+            load_source, raw, file_path.endswith(".bson"), TABLES[table][1], previous,
+            SHARED_COLUMNS[table] if shared else None,
+        )
+        self._sources[source] = {"stat": fingerprint, "digest": digest, **state}
+        return mode, frame
+
+    def _write_partitions(self, table, delta):
+        """
+        Regrava no armazenamento particionado apenas os meses tocados pelo delta
+        (ou a tabela inteira, quando delta é None). A regravação completa é pulada
+        quando o armazenamento já foi gravado a partir da mesma versão da origem (ex.:
+        por outro processo, ou por uma execução anterior).
+
+        Se a gravação falhar, a tabela fica marcada em store.stale e as seções passam a
+        ler a janela da memória até que uma regravação completa dê certo.
+        """
+        if self.store is None or table not in STORE_COLUMNS:
+            return
+        digest = self._sources[TABLES[table][0]]["digest"]
+        if table in self.store.stale:
+            delta = None
+        try:
+            if delta is None and self.store.source_version(table) == digest:
+                self.store.stale.discard(table)
+                return
+            months = None if delta is None else set(delta["createdAt"].dt.strftime("%Y-%m"))
+            self.store.write(table, self.tables[table], months, source=digest)
+            self.store.stale.discard(table)
+        except Exception as e:
+            self.store.stale.add(table)
+            print(f"Erro ao gravar partições de {table}: {e}")
+
+    def _publish(self, table):
+        """
+        Publica a tabela no conjunto compartilhado e passa a usar a versão mapeada em memória.
+        """
+        source = TABLES[table][0]
+        state = self._sources[source]
+        try:
+            self.tables[table], _ = self.shared.publish(
+                table, state["digest"], self.tables[table],
+                {key: state[key] for key in ("count", "first", "last")},
+            )
+        except Exception as e:
+            print(f"Erro ao publicar {table} no conjunto compartilhado: {e}")
+
+    def _refresh_table(self, table, updates):
+        """
+        Lê e normaliza uma tabela, registrando em updates o modo da mudança e o delta.
+        """
+        try:
+            mode, delta = self._read_source(TABLES[table][0], table)
+        except Exception as e:
+            print(f"Erro ao carregar os dados: {e}")
+            return
+        if mode is None:
+            return
+        if mode == "shared":
+            self.tables[table] = delta
+            updates[table] = ("full", delta)
+            self._write_partitions(table, None)
+            return
+
+        shared = self.shared is not None and table in SHARED_COLUMNS
+        if mode == "append":
+            self.tables[table] = pd.concat([self.tables[table], delta], ignore_index=True)
+        else:
+            self.tables[table] = delta
+        if shared:
+            self._publish(table)
+        updates[table] = (mode, delta)
+        self._write_partitions(table, delta if mode == "append" else None)
+
+    def _refresh_section(self, name, updates, results, errors):
+        """
+        Recalcula (ou mescla o delta de) uma seção se alguma de suas tabelas mudou,
+        gravando em results/errors (ainda não publicados).
+
+        :return: True se a seção foi atualizada.
+        """
+        section = self.sections[name]
+        inputs = set(section["tables"])
+        changed = inputs & updates.keys()
+        if not changed or not inputs <= self.tables.keys():
+            return False
+
+        # As funções de análise não alteram as tabelas recebidas: as seções rodam em
+        # paralelo sobre os mesmos DataFrames, que podem ser mapeamentos somente leitura.
+        tables = {table: self.tables[table] for table in section["tables"]}
+        try:
+            appended_only = all(updates[table][0] == "append" for table in changed)
+            if "merge" in section and name in results and appended_only:
+                section_deltas = {
+                    table: updates[table][1] if table in changed else tables[table].iloc[:0]
+                    for table in section["tables"]
+                }
+                results[name] = section["merge"](results[name], section_deltas, tables)
+            elif section.get("process"):
+                results[name] = self._run(section["compute"], tables, self.store)
+            else:
+                results[name] = section["compute"](tables, self.store)
+            errors.pop(name, None)
+        except Exception as e:
+            errors[name] = e
+        return True
+
+    def refresh(self):
+        """
+        Atualiza tabelas e seções afetadas pelos arquivos alterados. A leitura das tabelas e
+        o cálculo das seções formam um grafo de tarefas executado em paralelo: cada seção
+        começa assim que as suas tabelas de entrada estão prontas.
+
+        Os resultados são calculados em cópias e publicados de uma vez no final (novo
+        Snapshot com a versão seguinte): leitores nunca veem a versão nova com
+        resultados antigos, nem uma mistura de seções novas e antigas.
+
+        :return: Conjunto com os nomes das seções recalculadas ou mescladas.
+        """
+        with self._lock:
+            updates = {}
+            results, errors = dict(self._snapshot.results), dict(self._snapshot.errors)
+            tasks = {
+                f"table:{table}": (partial(self._refresh_table, table, updates), [])
+                for table in TABLES
+            }
+            for name, section in self.sections.items():
+                tasks[name] = (
+                    partial(self._refresh_section, name, updates, results, errors),
+                    [f"table:{table}" for table in section["tables"]],
+                )
+
+            refreshed, _ = run_task_graph(tasks, max_workers=self.max_workers)
+            if updates:
+                self._snapshot = Snapshot(self._snapshot.version + 1, results, errors)
+            return {name for name in self.sections if refreshed.get(name)}
+
+    def get(self, name):
+        """
+        Retorna o resultado publicado de uma seção, repassando o erro do último cálculo, se houver.
+        """
+        return self._snapshot.get(name)
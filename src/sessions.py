@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+from src.timebuckets import TIMEZONE, time_buckets
+
+MS_PER_SECOND = 1000
+# Inatividade padrão que encerra uma sessão de jogo
+SESSION_GAP_MINUTES = 30
+
+
+def user_time_order(codes, times):
+    """
+    Ordem estável das linhas por (usuário, horário), com uma única chave int64 quando ela
+    cabe em 63 bits (bem mais rápido que np.lexsort em dezenas de milhões de linhas).
+
+    :param codes: Códigos inteiros dos usuários (ex.: pd.factorize; -1 para linhas sem usuário).
+    :param times: Horários em epoch (int64).
+    :return: Índices que ordenam as linhas.
+    """
+    if len(codes) == 0:
+        return np.arange(0)
+    offsets = times - times.min()
+    span = int(offsets.max()) + 1
+    if (int(codes.max()) + 2) * span < np.iinfo(np.int64).max:
+        return np.argsort((codes.astype(np.int64) + 1) * span + offsets, kind="stable")
+    return np.lexsort((times, codes))
+
+
+def _ticket_times(starts, users, games, user_ids, game_ids, tickets, tolerance_ms):
+    """
+    Horário (epoch em ms) do primeiro ticket do mesmo usuário e jogo emitido até
+    tolerance_ms depois de cada início de partida (NaN quando não há).
+
+    Usuário e jogo viram uma única chave inteira; com os tickets ordenados por
+    (chave, horário), cada partida encontra o seu ticket com uma busca binária.
+
+    :param starts: Inícios das partidas (epoch em ms).
+    :param users: Código do usuário de cada partida (posição em user_ids).
+    :param games: Código do jogo de cada partida (posição em game_ids).
+    """
+    ticket_users = pd.Index(user_ids).get_indexer(tickets["user"].to_numpy(dtype=object))
+    ticket_games = pd.Index(game_ids).get_indexer(tickets["gameId"].to_numpy(dtype=object))
+    ticket_times = tickets["createdAt"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    known = (ticket_users >= 0) & (ticket_games >= 0) & (ticket_times != np.iinfo(np.int64).min)
+    result = np.full(len(starts), np.nan)
+    if not known.any():
+        return result
+
+    n_games = len(game_ids)
+    origin = min(starts.min(), ticket_times[known].min())
+    span = max(starts.max(), ticket_times[known].max()) - origin + 1
+    ticket_keys = np.sort((ticket_users[known] * n_games + ticket_games[known]) * span + (ticket_times[known] - origin))
+    match_keys = (users.astype(np.int64) * n_games + games) * span + (starts - origin)
+
+    positions = np.searchsorted(ticket_keys, match_keys, side="left")
+    found = positions < len(ticket_keys)
+    candidates = ticket_keys[np.minimum(positions, len(ticket_keys) - 1)]
+    # O ticket precisa ser da mesma chave (usuário e jogo) e estar dentro da tolerância
+    found &= (games >= 0) & (candidates // span == match_keys // span) & (candidates - match_keys <= tolerance_ms)
+    result[found] = (candidates[found] % span + origin).astype(float)
+    return result
+
+
+def sessionize(game_histories, tickets=None, gap_minutes=SESSION_GAP_MINUTES, match_seconds=None):
+    """
+    Divide o histórico de partidas em sessões por usuário: uma nova sessão começa quando
+    o intervalo desde a partida anterior do mesmo usuário passa de gap_minutes.
+
+    O histórico registra apenas o início das partidas; o fim de cada partida vem do
+    ticket emitido ao final dela (primeiro ticket do mesmo usuário e jogo antes da próxima
+    partida do usuário). Partidas sem ticket recebem a duração mediana medida do jogo.
+
+    Tudo é vetorizado: uma única ordenação por (userId, createdAt) e diferenças entre
+    linhas consecutivas, sem laços por usuário.
+
+    :param game_histories: DataFrame com userId, gameId e createdAt.
+    :param tickets: DataFrame de tickets (user, gameId, createdAt), usado para medir a
+        duração das partidas; sem ele, a duração é match_seconds.
+    :param gap_minutes: Inatividade (em minutos) que encerra uma sessão.
+    :param match_seconds: Duração atribuída às partidas sem ticket (padrão: mediana
+        medida por jogo; 0 quando não há tickets).
+    :return: DataFrame com uma linha por sessão: userId, start, end (fim da última
+        partida), matches, length_seconds.
+    """
+    # Partidas sem usuário não pertencem a nenhuma sessão
+    game_histories = game_histories[game_histories["userId"].notna()]
+    if game_histories.empty:
+        return pd.DataFrame(columns=["userId", "start", "end", "matches", "length_seconds"])
+
+    user_codes, user_ids = pd.factorize(game_histories["userId"])
+    timestamps = game_histories["createdAt"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+
+    order = user_time_order(user_codes, timestamps)
+    users = user_codes[order]
+    timestamps = timestamps[order]
+    game_codes, game_ids = pd.factorize(game_histories["gameId"] if "gameId" in game_histories else np.zeros(len(order)))
+    games = game_codes[order]
+
+    gap_ms = gap_minutes * 60 * MS_PER_SECOND
+    same_user = np.zeros(len(order), dtype=bool)
+    same_user[1:] = users[1:] == users[:-1]
+    new_session = np.ones(len(order), dtype=bool)
+    new_session[1:] = ~same_user[1:] | (np.diff(timestamps) > gap_ms)
+    starts = np.flatnonzero(new_session)
+    ends = np.append(starts[1:], len(order)) - 1
+
+    # Fim de cada partida: ticket da partida, desde que emitido antes da próxima partida do usuário
+    next_start = np.full(len(order), np.inf)
+    next_start[:-1][same_user[1:]] = timestamps[1:][same_user[1:]]
+    ticket_at = np.full(len(order), np.nan)
+    if tickets is not None and not tickets.empty:
+        ticket_at = _ticket_times(timestamps, users, games, user_ids, game_ids, tickets, gap_ms)
+        ticket_at[ticket_at > next_start] = np.nan
+    measured = ~np.isnan(ticket_at)
+
+    durations = np.full(len(order), np.nan)
+    durations[measured] = ticket_at[measured] - timestamps[measured]
+    if match_seconds is not None:
+        defaults = np.full(len(order), match_seconds * MS_PER_SECOND, dtype=float)
+    elif measured.any():
+        # Mediana medida do jogo (ou de todas as partidas, para jogos sem medição)
+        by_game = pd.Series(durations[measured]).groupby(games[measured]).median()
+        defaults = pd.Series(games).map(by_game).fillna(np.median(durations[measured])).to_numpy(dtype=float)
+    else:
+        defaults = np.zeros(len(order))
+    match_ends = timestamps + np.where(measured, durations, defaults)
+    session_ends = np.maximum.reduceat(match_ends, starts)
+
+    return pd.DataFrame({
+        "userId": user_ids[users[starts]],
+        "start": pd.to_datetime(timestamps[starts], unit="ms"),
+        "end": pd.to_datetime(session_ends.round().astype(np.int64), unit="ms"),
+        "matches": ends - starts + 1,
+        "length_seconds": (session_ends - timestamps[starts]) / MS_PER_SECOND,
+    })
+
+
+def _session_metrics(sessions, keys):
+    grouped = sessions.groupby(keys)
+    metrics = pd.DataFrame({
+        "Sessões": grouped.size(),
+        "Usuários": grouped["userId"].nunique(),
+        "Partidas": grouped["matches"].sum(),
+        "Duração Média da Sessão (s)": grouped["length_seconds"].mean(),
+        "Tempo de Tela (s)": grouped["length_seconds"].sum(),
+    })
+    metrics["Partidas por Sessão"] = metrics["Partidas"] / metrics["Sessões"]
+    metrics["Tempo Médio por Usuário (s)"] = metrics["Tempo de Tela (s)"] / metrics["Usuários"]
+    return metrics
+
+
+def daily_session_metrics(sessions, tz=TIMEZONE):
+    """
+    Métricas de sessão por dia (dia local de início da sessão).
+
+    :return: DataFrame indexado por data com sessões, usuários, partidas, duração média,
+        partidas por sessão e tempo médio de tela por usuário.
+    """
+    return _session_metrics(sessions, time_buckets(sessions["start"], "day", tz).rename("date"))
+
+
+def window_session_metrics(sessions, windows, tz=TIMEZONE):
+    """
+    Métricas de sessão para janelas arbitrárias (ex.: períodos das competições).
+
+    :param sessions: Sessões geradas por sessionize.
+    :param windows: DataFrame indexado pelo nome da janela com colunas start e end (datas locais inclusivas).
+    :param tz: Fuso horário dos dias.
+    :return: DataFrame com uma linha por janela.
+    """
+    days = time_buckets(sessions["start"], "day", tz)
+    rows = {}
+    for name, start, end in zip(windows.index, windows["start"], windows["end"]):
+        in_window = sessions[(days >= pd.to_datetime(start)) & (days <= pd.to_datetime(end))]
+        if in_window.empty:
+            continue
+        rows[name] = _session_metrics(in_window.assign(window=name), "window").iloc[0]
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def format_duration(seconds):
+    """
+    Formata segundos como "HH:MM:SS", o formato usado em competitions_gameroom.json.
+    """
+    if pd.isna(seconds):
+        return "N/A"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
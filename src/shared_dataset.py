@@ -0,0 +1,85 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from src.partitions import STORE_COLUMNS, normalize_columns
+
+# Tabelas compartilhadas entre sessões e processos, com as colunas usadas pelas análises
+SHARED_COLUMNS = {
+    **STORE_COLUMNS,
+    "orders": [*STORE_COLUMNS["orders"], "items"],
+    "users": [
+        "_id", "email", "name", "nickname", "coinsAvailable", "lastCoinsRenewal",
+        "referralCode", "dateOfBirth", "createdAt",
+    ],
+}
+
+METADATA_KEY = b"monaco"
+
+
+def _arrow_strings(arrow_type):
+    # Strings ficam no buffer Arrow (sem cópia para objetos Python)
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+class SharedDataset:
+    """
+    Conjunto de dados imutável em arquivos Arrow IPC mapeados em memória.
+
+    Cada tabela é gravada uma vez por versão do arquivo de origem (endereçada pelo hash
+    do conteúdo) e aberta com memory map: todas as sessões e processos que abrem a mesma
+    versão compartilham as mesmas páginas do sistema operacional, sem cópias. Os arrays
+    resultantes são somente leitura.
+    """
+
+    def __init__(self, shared_dir):
+        self.shared_dir = shared_dir
+        os.makedirs(shared_dir, exist_ok=True)
+
+    def _path(self, table, digest):
+        return os.path.join(self.shared_dir, f"{table}-{digest}.arrow")
+
+    def has(self, table, digest):
+        return os.path.exists(self._path(table, digest))
+
+    def open(self, table, digest):
+        """
+        Mapeia uma versão publicada da tabela.
+
+        :return: Tupla (DataFrame somente leitura, metadados gravados na publicação).
+        """
+        source = pa.memory_map(self._path(table, digest), "r")
+        arrow_table = pa.ipc.open_file(source).read_all()
+        metadata = json.loads((arrow_table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+        frame = arrow_table.to_pandas(split_blocks=True, self_destruct=False, types_mapper=_arrow_strings)
+        return frame, metadata
+
+    def publish(self, table, digest, frame, metadata=None):
+        """
+        Grava a tabela (se essa versão ainda não existir), remove versões antigas e
+        retorna a versão mapeada em memória.
+        """
+        path = self._path(table, digest)
+        if not os.path.exists(path):
+            arrow_table = pa.Table.from_pandas(normalize_columns(frame, SHARED_COLUMNS[table]), preserve_index=False)
+            arrow_table = arrow_table.replace_schema_metadata({
+                **(arrow_table.schema.metadata or {}),
+                METADATA_KEY: json.dumps(metadata or {}).encode(),
+            })
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with pa.OSFile(temp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                    writer.write_table(arrow_table)
+            os.replace(temp_path, path)
+
+            # Processos que ainda mapeiam versões antigas continuam válidos após a remoção
+            for old_path in glob.glob(os.path.join(self.shared_dir, f"{table}-*.arrow")):
+                if old_path != path:
+                    os.remove(old_path)
+
+        return self.open(table, digest)
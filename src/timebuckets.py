@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# Fuso horário usado nos gráficos: as partidas da madrugada no Brasil pertencem ao dia
+# (e ao mês) local, não ao dia UTC seguinte
+TIMEZONE = "America/Sao_Paulo"
+
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+# Granularidade -> formato do rótulo de cada intervalo
+GRANULARITIES = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-%m-%d",  # semana identificada pela segunda-feira
+    "month": "%Y-%m",
+}
+
+# Granularidade seguinte no detalhamento (mês -> dia -> hora)
+DRILL_DOWN = {"month": "day", "day": "hour"}
+
+_NAT = np.iinfo(np.int64).min
+
+
+def epoch_ms(timestamps):
+    """
+    Converte datas UTC (sem fuso) em epoch em milissegundos (int64; NaT vira o mínimo do int64).
+    """
+    return pd.Series(timestamps).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+
+
+def _utc_offsets_ms(hours, tz):
+    # Deslocamento do fuso calculado uma vez por hora do intervalo coberto (e não por
+    # linha) e distribuído às linhas por indexação
+    first = int(hours.min())
+    grid = pd.date_range(pd.Timestamp(first * MS_PER_HOUR, unit="ms"), periods=int(hours.max()) - first + 1, freq="h")
+    local = grid.tz_localize("UTC").tz_convert(tz).tz_localize(None)
+    offsets = local.as_unit("ms").asi8 - grid.as_unit("ms").asi8
+    return offsets[hours - first]
+
+
+def bucket_epoch_ms(values, granularity="month", tz=TIMEZONE):
+    """
+    Início de cada intervalo (hora, dia, semana ou mês) no horário local, operando
+    diretamente sobre epoch em milissegundos.
+
+    :param values: Array int64 de epoch em milissegundos (UTC).
+    :param granularity: "hour", "day", "week" ou "month".
+    :param tz: Fuso horário dos intervalos (None para UTC).
+    :return: Array int64 com o início do intervalo em horário local (epoch em ms do
+        horário de parede); valores ausentes continuam ausentes.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidade inválida: {granularity}. Use {list(GRANULARITIES)}.")
+
+    values = np.asarray(values, dtype=np.int64)
+    missing = values == _NAT
+    buckets = np.full(values.shape, _NAT, dtype=np.int64)
+    local = values[~missing]
+    if local.size == 0:
+        return buckets
+    if tz is not None:
+        local = local + _utc_offsets_ms(local // MS_PER_HOUR, tz)
+
+    if granularity == "hour":
+        buckets[~missing] = local - local % MS_PER_HOUR
+    elif granularity == "day":
+        buckets[~missing] = local - local % MS_PER_DAY
+    elif granularity == "week":
+        days = local // MS_PER_DAY
+        # 1970-01-01 foi uma quinta-feira: (dias + 3) % 7 é a distância até a segunda-feira
+        buckets[~missing] = (days - (days + 3) % 7) * MS_PER_DAY
+    else:
+        # Início do mês de cada dia do intervalo coberto, distribuído às linhas por
+        # indexação (converter cada linha para datetime64[M] é bem mais lento)
+        days = local // MS_PER_DAY
+        first = int(days.min())
+        grid = np.arange(first, int(days.max()) + 1).astype("datetime64[D]")
+        month_starts = grid.astype("datetime64[M]").astype("datetime64[ms]").astype(np.int64)
+        buckets[~missing] = month_starts[days - first]
+    return buckets
+
+
+def time_buckets(timestamps, granularity="month", tz=TIMEZONE):
+    """
+    Intervalo local de cada data, para agrupar séries temporais.
+
+    :param timestamps: Series de datas UTC sem fuso (ex.: createdAt).
+    :param granularity: "hour", "day", "week" ou "month".
+    :param tz: Fuso horário dos intervalos.
+    :return: Series datetime64 (início do intervalo em horário local) com o mesmo índice,
+        nomeada pela granularidade.
+    """
+    timestamps = pd.Series(timestamps)
+    buckets = bucket_epoch_ms(epoch_ms(timestamps), granularity, tz)
+    return pd.Series(buckets.view("datetime64[ms]"), index=timestamps.index, name=granularity)
+
+
+def bucket_labels(buckets, granularity="month"):
+    """
+    Rótulos de texto dos intervalos (ex.: "2024-12" para meses), formatando cada valor
+    distinto uma única vez.
+    """
+    codes, unique = pd.factorize(pd.DatetimeIndex(buckets))
+    labels = np.append(np.asarray(unique.strftime(GRANULARITIES[granularity]), dtype=object), None)
+    return pd.Index(labels[codes], name=getattr(buckets, "name", None))
+
+
+def within_bucket(timestamps, period, granularity="month", tz=TIMEZONE):
+    """
+    Máscara das datas que caem no intervalo local `period` (rótulo ou início do intervalo).
+    """
+    return (time_buckets(timestamps, granularity, tz) == pd.Timestamp(period)).to_numpy()
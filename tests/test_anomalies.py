@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from src.anomalies import ANOMALY_RULES, TicketAnomalyDetector
+
+
+def _tickets(seed=7, n_users=200, n_rows=40_000):
+    # Tickets espalhados em três dias, mais rajadas de alguns usuários (para haver
+    # sinalizações nas duas regras)
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-11-01").value // 1_000_000
+    users = rng.integers(0, n_users, n_rows)
+    times = start + rng.integers(0, 3 * 86_400_000, n_rows)
+    bursts = rng.integers(0, n_users, 30)
+    burst_users = np.repeat(bursts, 40)
+    burst_times = np.repeat(start + rng.integers(0, 3 * 86_400_000, 30), 40) + rng.integers(0, 90_000, 1_200)
+    tickets = pd.DataFrame({
+        "user": np.char.add("user-", np.concatenate([users, burst_users]).astype(str)),
+        "createdAt": pd.to_datetime(np.concatenate([times, burst_times]), unit="ms"),
+        "amount": rng.integers(0, 120, n_rows + len(burst_users)).astype(float),
+    })
+    return tickets.sort_values("createdAt", kind="stable", ignore_index=True)
+
+
+def _brute_force_peaks(tickets):
+    # Métrica de cada regra por ticket com rolling de pandas (janela (t - w, t]) e o
+    # pico por usuário, apenas dos usuários que passaram do limite
+    peaks = {}
+    for name, rule in ANOMALY_RULES.items():
+        by_user = tickets.set_index("createdAt").groupby("user")["amount"]
+        rolling = by_user.rolling(f"{rule['window_seconds']}s")
+        values = rolling.count() if rule["metric"] == "count" else rolling.sum()
+        peak = values.groupby(level="user").max()
+        peaks[name] = peak[peak > rule["threshold"]].sort_index()
+    return peaks
+
+
+def _detector_peaks(flags):
+    return {
+        name: flags[flags["Regra"] == name].groupby("Usuário")["Pico"].max().rename_axis("user").sort_index()
+        for name in ANOMALY_RULES
+    }
+
+
+def test_detector_matches_pandas_rolling_brute_force():
+    tickets = _tickets()
+    flags = TicketAnomalyDetector().process(tickets).flags()
+
+    expected, actual = _brute_force_peaks(tickets), _detector_peaks(flags)
+    for name in ANOMALY_RULES:
+        assert len(expected[name]) > 0
+        pd.testing.assert_series_equal(actual[name], expected[name], check_names=False, check_dtype=False)
+
+
+def test_chunked_processing_matches_batch():
+    tickets = _tickets()
+    batch = TicketAnomalyDetector().process(tickets).flags()
+
+    chunked = TicketAnomalyDetector()
+    for chunk in np.array_split(np.arange(len(tickets)), 9):
+        chunked.process(tickets.iloc[chunk])
+
+    pd.testing.assert_frame_equal(chunked.flags(), batch)
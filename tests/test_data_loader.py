@@ -0,0 +1,18 @@
+import json
+
+import bson
+
+from src.data_loader import load_json_data, source_path
+
+
+def test_bson_dump_is_preferred_over_extended_json(tmp_path):
+    (tmp_path / "tickets.json").write_text(json.dumps([{"amount": 1}]))
+    (tmp_path / "tickets.bson").write_bytes(bson.encode({"amount": 2}))
+    (tmp_path / "users.json").write_text(json.dumps([{"nickname": "a"}]))
+
+    assert source_path(tmp_path, "tickets") == str(tmp_path / "tickets.bson")
+    assert source_path(tmp_path, "users") == str(tmp_path / "users.json")
+
+    data = load_json_data(tmp_path)
+    assert data["tickets"]["amount"].tolist() == [2]
+    assert data["users"] == [{"nickname": "a"}]
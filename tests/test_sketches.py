@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from src.sketches import HyperLogLog, KLLSketch, build_sketch_cells, merge_sketch_cells, summarize_sketches
+
+# Limites documentados em src/sketches.py
+HLL_P = 12
+HLL_MAX_ERROR = 3 * 1.04 / np.sqrt(1 << HLL_P)  # ~3 desvios padrão (~4,9%)
+KLL_MAX_RANK_ERROR = 0.0165
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def _user_ids(rng, n_rows, n_users):
+    return np.char.add("user-", rng.integers(0, n_users, n_rows).astype(str))
+
+
+def _assert_quantiles_within_rank_error(values, estimates, qs):
+    # Erro de rank de até ε: cada estimativa fica entre os quantis exatos q - ε e q + ε
+    qs = np.asarray(qs)
+    lower = np.quantile(values, np.clip(qs - KLL_MAX_RANK_ERROR, 0, 1), method="inverted_cdf")
+    upper = np.quantile(values, np.clip(qs + KLL_MAX_RANK_ERROR, 0, 1), method="inverted_cdf")
+    assert ((estimates >= lower) & (estimates <= upper)).all(), (estimates, lower, upper)
+
+
+def test_hyperloglog_error_within_bound():
+    rng = np.random.default_rng(1)
+    for n_users in [500, 20_000, 300_000]:
+        users = _user_ids(rng, 2 * n_users, n_users)
+        exact = pd.Series(users).nunique()
+        estimate = HyperLogLog(HLL_P).add(users).estimate()
+        assert abs(estimate - exact) / exact <= HLL_MAX_ERROR, (n_users, estimate, exact)
+
+
+def test_kll_rank_error_within_bound():
+    rng = np.random.default_rng(2)
+    for values in [rng.lognormal(3, 1, 200_000), rng.integers(1, 50, 100_000).astype(float)]:
+        _assert_quantiles_within_rank_error(values, KLLSketch().add(values).quantiles(QUANTILES), QUANTILES)
+
+
+def test_merged_sketches_match_single_sketch():
+    rng = np.random.default_rng(3)
+    users = _user_ids(rng, 120_000, 40_000)
+    values = rng.lognormal(3, 1, users.size)
+    chunks = np.array_split(np.arange(users.size), 7)
+
+    single_users = HyperLogLog(HLL_P).add(users)
+    single_values = KLLSketch().add(values)
+    merged_users, merged_values = HyperLogLog(HLL_P), KLLSketch()
+    for chunk in chunks:
+        merged_users = merged_users.merge(HyperLogLog(HLL_P).add(users[chunk]))
+        merged_values = merged_values.merge(KLLSketch().add(values[chunk]))
+
+    # HyperLogLog: a mescla (máximo dos registradores) é exata
+    np.testing.assert_array_equal(merged_users.registers, single_users.registers)
+    assert merged_users.estimate() == single_users.estimate()
+
+    # KLL: a mescla tem o mesmo número de registros e o mesmo limite de erro
+    assert merged_values.count == single_values.count == values.size
+    _assert_quantiles_within_rank_error(values, merged_values.quantiles(QUANTILES), QUANTILES)
+    _assert_quantiles_within_rank_error(values, single_values.quantiles(QUANTILES), QUANTILES)
+
+
+def _tickets(rng, n_rows):
+    return pd.DataFrame({
+        "createdAt": pd.Timestamp("2024-07-01") + pd.to_timedelta(rng.integers(0, 60 * 86_400, n_rows), unit="s"),
+        "user": _user_ids(rng, n_rows, 5_000),
+        "gameId": rng.choice(["1", "2", "3", "4"], n_rows),
+        "amount": rng.integers(1, 100, n_rows),
+    }).sort_values("createdAt", ignore_index=True)
+
+
+def test_merged_cells_match_cells_built_at_once():
+    rng = np.random.default_rng(4)
+    tickets = _tickets(rng, 50_000)
+    events = pd.DataFrame({
+        "title": ["Evento"],
+        "startDate": [pd.Timestamp("2024-07-15")],
+        "endDate": [pd.Timestamp("2024-07-31")],
+    })
+    split = len(tickets) * 2 // 3
+
+    full = build_sketch_cells(tickets, "user", "amount", game_column="gameId", game_events=events)
+    merged = merge_sketch_cells(
+        build_sketch_cells(tickets.iloc[:split], "user", "amount", game_column="gameId", game_events=events),
+        build_sketch_cells(tickets.iloc[split:], "user", "amount", game_column="gameId", game_events=events),
+    )
+
+    for by in ["event", "month", "gameId"]:
+        expected, actual = summarize_sketches(full, by), summarize_sketches(merged, by)
+        pd.testing.assert_frame_equal(
+            expected[[by, "Usuários Distintos (aprox.)", "Registros"]],
+            actual[[by, "Usuários Distintos (aprox.)", "Registros"]],
+        )
+
+
+def test_merge_relabels_cells_with_new_events():
+    rng = np.random.default_rng(5)
+    tickets = _tickets(rng, 5_000)
+    cells = build_sketch_cells(tickets, "user", "amount", game_column="gameId")
+    # Horários ao meio-dia (UTC): o dia local em São Paulo é o mesmo
+    events = pd.DataFrame({
+        "title": ["Novo Evento"],
+        "startDate": [pd.Timestamp("2024-07-10 12:00")],
+        "endDate": [pd.Timestamp("2024-07-20 12:00")],
+    })
+
+    merged = merge_sketch_cells(cells, cells.iloc[:0], events)
+
+    in_event = (merged["date"] >= "2024-07-10") & (merged["date"] <= "2024-07-20")
+    assert (merged.loc[in_event, "event"] == "Novo Evento").all()
+    assert (merged.loc[~in_event, "event"] != "Novo Evento").all()
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.timebuckets import TIMEZONE, time_buckets
+
+# Granularidade -> frequência equivalente de pandas Period (semanas começam na segunda-feira)
+PERIOD_FREQS = {"hour": "h", "day": "D", "week": "W-SUN", "month": "M"}
+
+
+def _timestamps():
+    # Datas UTC de 2017 a 2019 (anos com horário de verão no Brasil), com todas as horas
+    # em volta das mudanças de horário, datas aleatórias e NaT
+    rng = np.random.default_rng(6)
+    start, end = pd.Timestamp("2017-01-01"), pd.Timestamp("2020-01-01")
+    random_ms = rng.integers(start.value // 1_000_000, end.value // 1_000_000, 50_000)
+    transitions = [
+        pd.Timestamp(date) + pd.Timedelta(hours=hour) + pd.Timedelta(minutes=minute)
+        for date in ["2017-02-19", "2017-10-15", "2018-02-18", "2018-11-04", "2019-02-17"]
+        for hour in range(-6, 30)
+        for minute in [0, 59]
+    ]
+    return pd.Series(np.concatenate([
+        pd.to_datetime(random_ms, unit="ms").to_numpy(),
+        pd.DatetimeIndex(transitions).to_numpy(),
+        np.array(["NaT"] * 3, dtype="datetime64[ns]"),
+    ]))
+
+
+@pytest.mark.parametrize("granularity", list(PERIOD_FREQS))
+def test_time_buckets_match_pandas_timezone_periods(granularity):
+    timestamps = _timestamps()
+    local = timestamps.dt.tz_localize("UTC").dt.tz_convert(TIMEZONE).dt.tz_localize(None)
+    expected = local.dt.to_period(PERIOD_FREQS[granularity]).dt.start_time
+
+    actual = time_buckets(timestamps, granularity)
+
+    assert actual.isna().sum() == 3
+    pd.testing.assert_series_equal(
+        actual.astype("datetime64[ns]"), expected.astype("datetime64[ns]"), check_names=False
+    )